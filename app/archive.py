@@ -0,0 +1,138 @@
+"""
+Archiwizacja ofert zakończonych aukcji - w tle, poza transakcją zamknięcia.
+Zamiast jednego dokumentu na ofertę zapisujemy kubełki (auction.bids.buckets):
+    {_id: "<auction_id>:<n>", auction_id, bucket: n, count, start_ts, end_ts, min_amount, max_amount,
+     user_ids: [...], amounts: [...], timestamps: [...]}
+po co najwyżej BID_BUCKET_SIZE ofert, w kolejności seq (oferty sprzed numeracji - po czasie).
+Mniej dokumentów i wpisów w indeksach,
+a odczyt historii aukcji lub zakresu czasu to kilka dokumentów zamiast tysięcy.
+Dokument historii ma flagę bids_archived; archive_pending dokańcza zadania przerwane np. restartem.
+"""
+import asyncio
+import logging
+from pymongo.errors import PyMongoError
+
+from config import BID_BUCKET_SIZE
+from database import bids_collection, bid_buckets_collection, history_collection, bid_buckets_read_collection, get_client
+
+logger = logging.getLogger("auction_app")
+
+# Referencje do zadań w tle (inaczej mogłyby zostać usunięte przez GC)
+_archive_tasks = set()
+
+
+def _bucket_doc(auction_id: str, n: int, bids: list) -> dict:
+    amounts = [b["amount"] for b in bids]
+    timestamps = [b["timestamp"] for b in bids]
+    return {
+        "_id": f"{auction_id}:{n}",
+        "auction_id": auction_id,
+        "bucket": n,
+        "count": len(bids),
+        "start_ts": min(timestamps),
+        "end_ts": max(timestamps),
+        "min_amount": min(amounts),
+        "max_amount": max(amounts),
+        "user_ids": [b["user_id"] for b in bids],
+        "amounts": amounts,
+        "timestamps": timestamps
+    }
+
+
+async def _pack_bucket(auction_id: str, n: int, bids: list):
+    """Zapis kubełka i usunięcie dokładnie tych ofert - w jednej transakcji (bez utraty i bez duplikatów)."""
+    async def pack(session):
+        await bid_buckets_collection.replace_one(
+            {"_id": f"{auction_id}:{n}"}, _bucket_doc(auction_id, n, bids), upsert=True, session=session
+        )
+        await bids_collection.delete_many({"_id": {"$in": [b["_id"] for b in bids]}}, session=session)
+
+    async with await get_client().start_session() as session:
+        await session.with_transaction(pack)
+
+
+async def _archive_pass(auction_id: str) -> int:
+    """Jeden przebieg: pakuje oferty obecne w auction.bids w kolejne kubełki. Zwraca liczbę ofert."""
+    last = await bid_buckets_collection.find_one({"auction_id": auction_id}, sort=[("bucket", -1)], projection={"bucket": 1})
+    n = last["bucket"] + 1 if last else 0
+    archived = 0
+    chunk = []
+    cursor = bids_collection.find({"auction_id": auction_id}, allow_disk_use=True) \
+        .sort([("seq", 1), ("timestamp", 1), ("_id", 1)]) \
+        .batch_size(BID_BUCKET_SIZE)
+    async for bid in cursor:
+        chunk.append(bid)
+        if len(chunk) == BID_BUCKET_SIZE:
+            await _pack_bucket(auction_id, n, chunk)
+            archived += len(chunk)
+            n += 1
+            chunk = []
+    if chunk:
+        await _pack_bucket(auction_id, n, chunk)
+        archived += len(chunk)
+    return archived
+
+
+async def archive_bids(auction_id: str):
+    """
+    Pakuje oferty aukcji w kubełki i usuwa je z auction.bids.
+    - każdy kubełek zapisujemy razem z usunięciem dokładnie spakowanych ofert (transakcja),
+      więc przerwanie w dowolnym miejscu nie gubi ani nie dubluje ofert - ponowienie zaczyna od kolejnego kubełka,
+    - zapis oferty następuje po aktualizacji ceny, więc oferta równoległa z zamknięciem może pojawić się
+      w trakcie archiwizacji: powtarzamy przebiegi aż do pustego, także po ustawieniu flagi bids_archived.
+    """
+    while await _archive_pass(auction_id):
+        pass
+    await history_collection.update_one({"auction_id": auction_id}, {"$set": {"bids_archived": True}})
+    # Spóźnione zapisy z okna między ostatnim przebiegiem a ustawieniem flagi
+    while await _archive_pass(auction_id):
+        pass
+
+
+def schedule_archive(auction_id: str):
+    """Uruchamia archiwizację w tle (nie wydłuża żądania zamknięcia)."""
+    async def run():
+        try:
+            await archive_bids(auction_id)
+        except PyMongoError as e:
+            logger.error("Archiwizacja ofert aukcji %s nie powiodła się: %s", auction_id, e)
+
+    task = asyncio.create_task(run())
+    _archive_tasks.add(task)
+    task.add_done_callback(_archive_tasks.discard)
+
+
+async def archive_pending():
+    """Dokończenie archiwizacji przerwanych wcześniej (wywoływane przy starcie)."""
+    async for doc in history_collection.find({"bids_archived": False}, projection={"auction_id": 1}):
+        try:
+            await archive_bids(doc["auction_id"])
+        except PyMongoError as e:
+            logger.error("Archiwizacja ofert aukcji %s nie powiodła się: %s", doc["auction_id"], e)
+
+
+async def read_bid_history(auction_id: str, session=None):
+    """Oferty zarchiwizowanej aukcji w kolejności czasu (generator, kubełek po kubełku)."""
+    async for bucket in bid_buckets_read_collection.find({"auction_id": auction_id}, session=session).sort("bucket", 1):
+        for user_id, amount, ts in zip(bucket["user_ids"], bucket["amounts"], bucket["timestamps"]):
+            yield {"auction_id": auction_id, "user_id": user_id, "amount": amount, "timestamp": ts}
+
+
+async def bid_activity(start, end, session=None) -> list:
+    """
+    Aktywność licytacji w oknie [start, end): per aukcja liczba ofert, najwyższa kwota,
+    pierwsza i ostatnia oferta. Skanuje tylko kubełki nachodzące na okno.
+    """
+    activity = {}
+    async for bucket in bid_buckets_read_collection.find({"end_ts": {"$gte": start}, "start_ts": {"$lt": end}}, session=session):
+        for amount, ts in zip(bucket["amounts"], bucket["timestamps"]):
+            if not (start <= ts < end):
+                continue
+            entry = activity.setdefault(bucket["auction_id"], {
+                "auction_id": bucket["auction_id"], "bids": 0, "max_amount": amount, "first_bid": ts, "last_bid": ts
+            })
+            entry["bids"] += 1
+            entry["max_amount"] = max(entry["max_amount"], amount)
+            entry["first_bid"] = min(entry["first_bid"], ts)
+            entry["last_bid"] = max(entry["last_bid"], ts)
+    return sorted(activity.values(), key=lambda e: e["bids"], reverse=True)
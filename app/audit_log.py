@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+
+from config import LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL_SECONDS, LOG_OVERFLOW_POLICY, LOG_SPILL_FILE
+from database import logs_collection
+
+logger = logging.getLogger("auction_app")
+
+
+class AuditLogWriter:
+    """
+    Buforowany zapis logów operacji do kolekcji 'log'.
+    - handlery tylko wrzucają wpis do ograniczonej kolejki (enqueue),
+    - worker w tle zapisuje paczki insert_many po LOG_BATCH_SIZE wpisów albo co LOG_FLUSH_INTERVAL_SECONDS,
+    - przy pełnej kolejce działa polityka: block (czekamy), drop (odrzucamy), spill (dopisujemy do pliku),
+    - przy zamknięciu aplikacji kolejka jest opróżniana (stop, najwyżej STOP_TIMEOUT_SECONDS),
+    - błąd zapisu paczki (dowolny, nie tylko PyMongoError) nie zatrzymuje workera - paczka idzie
+      do pliku albo jest odrzucana, a kolejka jest dalej opróżniana.
+    """
+
+    STOP_TIMEOUT_SECONDS = 10.0
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float, overflow_policy: str, spill_file: str):
+        if overflow_policy not in ("block", "drop", "spill"):
+            raise ValueError(f"Nieznana polityka przepełnienia: {overflow_policy}")
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.spill_file = spill_file
+        self._task = None
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    async def enqueue(self, entry: dict):
+        if self._task is None or self._task.done():
+            # Worker nie działa (np. skrypt poza aplikacją) - zapis bezpośredni
+            await logs_collection.insert_one(entry)
+            return
+        if self.overflow_policy == "block":
+            await self.queue.put(entry)
+            return
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            if self.overflow_policy == "spill":
+                await self._spill([entry])
+            else:
+                self.dropped += 1
+
+    def _spill_sync(self, entries: list):
+        with open(self.spill_file, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v)) + "\n")
+
+    async def _spill(self, entries: list):
+        """Dopisanie wpisów do pliku (w puli wątków - bez blokowania pętli). Błąd pliku = odrzucenie."""
+        try:
+            await asyncio.to_thread(self._spill_sync, entries)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error("Nie udało się zrzucić %d logów do pliku: %s", len(entries), e)
+            self.dropped += len(entries)
+            return
+        self.spilled += len(entries)
+
+    async def _write(self, batch: list):
+        try:
+            await logs_collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            # PyMongoError, ale też np. InvalidDocument (niekodowalne details) - worker musi działać dalej
+            logger.error("Nie udało się zapisać %d logów: %s", len(batch), e)
+            if self.spill_file:
+                await self._spill(batch)
+            else:
+                self.dropped += len(batch)
+
+    async def _run(self):
+        # None w kolejce oznacza zamknięcie - zapisujemy bieżącą paczkę i kończymy
+        while True:
+            entry = await self.queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    await self._write(batch)
+                    return
+                batch.append(entry)
+            await self._write(batch)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Zatrzymuje workera po zapisaniu wszystkiego, co zostało w kolejce."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        try:
+            if not task.done():
+                await asyncio.wait_for(self.queue.put(None), self.STOP_TIMEOUT_SECONDS)
+            await asyncio.wait_for(task, self.STOP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error("Worker logów nie zakończył się w %.0f s - pozostało %d wpisów", self.STOP_TIMEOUT_SECONDS, self.queue.qsize())
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "overflow_policy": self.overflow_policy
+        }
+
+
+audit_log = AuditLogWriter(LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL_SECONDS, LOG_OVERFLOW_POLICY, LOG_SPILL_FILE)
@@ -0,0 +1,381 @@
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from config import BID_RECORD_RETRIES, BID_INCREMENT, PROXY_CAS_RETRIES
+from database import auctions_collection, bids_collection
+from cache import auction_cache
+from broker import bid_broker, price_event
+from change_feed import auction_changes
+from metrics import bids_total, bid_record_retries_total, transaction_retries_total
+from consistency import write_session, record_write
+
+
+def _parse_auction_id(auction_id: str) -> ObjectId:
+    try:
+        return ObjectId(auction_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator aukcji")
+
+
+async def _write_bid_record(bid_data: dict, session=None) -> dict:
+    """
+    Idempotentny zapis oferty: klucz (auction_id, seq) jest unikalny,
+    więc ponowienie po błędzie sieci nie tworzy duplikatu.
+    """
+    key = {"auction_id": bid_data["auction_id"], "seq": bid_data["seq"]}
+    last_error = None
+    for attempt in range(BID_RECORD_RETRIES):
+        if attempt:
+            bid_record_retries_total.inc()
+        try:
+            result = await bids_collection.update_one(key, {"$setOnInsert": bid_data}, upsert=True, session=session)
+        except PyMongoError as e:
+            last_error = e
+            continue
+        if result.upserted_id is not None:
+            return {"_id": result.upserted_id, **bid_data}
+        return await bids_collection.find_one(key, session=session)
+    raise HTTPException(status_code=500, detail=f"Błąd zapisu oferty: {last_error}")
+
+
+async def _rejection(auction_id: str, now: datetime):
+    """(status_code, powód) odrzucenia, gdy aktualizacja warunkowa nic nie zmieniła."""
+    current = await auction_cache.get(auction_id)
+    if current is None:
+        return 404, "Aukcja nie znaleziona"
+    if current.get("ends_at") is not None and current["ends_at"] <= now:
+        return 400, "Aukcja już się zakończyła"
+    return 400, "Kwota oferty musi być wyższa niż bieżąca cena"
+
+
+async def _needs_proxy_path(auction_id: str, amount: float, now: datetime) -> bool:
+    """
+    Czy odrzucenie przez szybką ścieżkę mogło wynikać z ofert maksymalnych na aukcji.
+    Także gdy cache pokazuje cenę niższą od kwoty (nieaktualny wpis) - _apply_proxy czyta z bazy.
+    """
+    current = await auction_cache.get(auction_id)
+    if current is None or (current.get("ends_at") is not None and current["ends_at"] <= now):
+        return False
+    return bool(current.get("proxy_top")) or amount > current["current_price"]
+
+
+async def _manual_proxy_bid(auction_id: str, user_id: str, amount: float) -> dict:
+    """Oferta ręczna na aukcji z ofertami maksymalnymi. Zwraca dokument oferty użytkownika."""
+    _, written = await _apply_proxy(auction_id, user_id, amount, manual=True)
+    own = next((bid for bid in written if bid["user_id"] == user_id and bid["amount"] == amount), None)
+    if own is None:
+        # Nie powinno wystąpić - _resolve odrzuca przed zapisem ofertę ręczną, której nie zapisze
+        raise HTTPException(status_code=400, detail="Oferta przebita przez ofertę maksymalną innego użytkownika")
+    return own
+
+def _resolve(auc: dict, user_id: str, value: float, manual: bool, now: datetime):
+    """
+    Rozstrzygnięcie licytacji z ofertami maksymalnymi (proxy) - funkcja czysta na dokumencie aukcji.
+    - proxy_top: do dwóch najwyższych maksimów [{user_id, max_amount, at}] (remis wygrywa wcześniejsze),
+    - prowadzący bez oferty maksymalnej (albo "dom" przy braku ofert) ma limit równy bieżącej cenie,
+    - cena = min(maksimum prowadzącego, drugie maksimum + BID_INCREMENT); oferta ręczna (manual),
+      która prowadzi, ustala cenę równą swojej kwocie; oferta ręczna poniżej własnego maksimum
+      nie zastępuje tego maksimum (prowadzący podnosi tylko cenę),
+    - oferty do zapisu odpowiadają sekwencji, którą dałyby kolejne pojedyncze przebicia:
+      najwyżej maksimum przegrywającego i odpowiedź prowadzącego - stała liczba zapisów,
+      niezależnie od liczby licytujących automatycznie,
+    - oferta ręczna, która nie zostałaby zapisana (remis z wcześniejszym maksimum - prowadzący
+      odpowiada tą samą kwotą), jest odrzucana tutaj, przed jakimkolwiek zapisem (400).
+    Zwraca (proxy_top, cena, prowadzący, [(user_id, kwota), ...]).
+    """
+    price = auc["current_price"]
+    leader = auc.get("highest_bidder_id")
+    entries = [entry for entry in auc.get("proxy_top") or [] if entry["user_id"] != user_id]
+    own = next((entry for entry in auc.get("proxy_top") or [] if entry["user_id"] == user_id), None)
+    if leader != user_id and all(entry["user_id"] != leader for entry in entries):
+        entries.append({"user_id": leader, "max_amount": price, "at": datetime.min})
+    if manual and own is not None and value < own["max_amount"]:
+        incoming = dict(own)
+    else:
+        incoming = {"user_id": user_id, "max_amount": value, "at": now}
+    entries.append(incoming)
+    entries.sort(key=lambda entry: (-entry["max_amount"], entry["at"]))
+
+    top, second = entries[0], entries[1] if len(entries) > 1 else None
+    if manual and top is incoming:
+        new_price = value
+    elif second is None:
+        new_price = price  # tylko prowadzący zmienia swoje maksimum
+    else:
+        new_price = max(price, min(top["max_amount"], second["max_amount"] + BID_INCREMENT))
+
+    records = []
+    if second is not None and second["user_id"] is not None and price < second["max_amount"] < new_price:
+        records.append((second["user_id"], second["max_amount"]))
+    if top["user_id"] != leader or new_price > price:
+        records.append((top["user_id"], new_price))
+    if manual and (user_id, value) not in records:
+        raise HTTPException(status_code=400, detail="Oferta przebita przez ofertę maksymalną innego użytkownika")
+
+    # Bez aktywnego maksimum (prowadzący wyczerpał limit) oferty wracają na szybką ścieżkę apply_bid
+    proxy_top = [
+        {"user_id": entry["user_id"], "max_amount": entry["max_amount"], "at": entry["at"]}
+        for entry in entries[:2] if entry["user_id"] is not None
+    ] if top["max_amount"] > new_price else []
+    return proxy_top, new_price, top["user_id"], records
+
+
+async def _apply_proxy(auction_id: str, user_id: str, value: float, manual: bool):
+    """
+    Oferta na aukcji z ofertami maksymalnymi: odczyt dokumentu, _resolve i jedna aktualizacja
+    warunkowa (CAS na bid_seq + proxy_rev). Przy konflikcie z równoległą ofertą - ponowienie.
+    Zwraca (dokument aukcji po zmianie, zapisane oferty).
+    """
+    oid = _parse_auction_id(auction_id)
+    for attempt in range(PROXY_CAS_RETRIES):
+        if attempt:
+            transaction_retries_total.inc(operation="proxy_bid")
+        now = datetime.now()
+        auc = await auctions_collection.find_one({"_id": oid})
+        if auc is None:
+            raise HTTPException(status_code=404, detail="Aukcja nie znaleziona")
+        if auc.get("ends_at") is not None and auc["ends_at"] <= now:
+            raise HTTPException(status_code=400, detail="Aukcja już się zakończyła")
+        if value <= auc["current_price"]:
+            raise HTTPException(status_code=400, detail="Kwota oferty musi być wyższa niż bieżąca cena")
+        own = next((entry for entry in auc.get("proxy_top") or [] if entry["user_id"] == user_id), None)
+        if not manual and own is not None and value < own["max_amount"]:
+            raise HTTPException(status_code=400, detail="Nie można obniżyć oferty maksymalnej")
+
+        proxy_top, price, leader, records = _resolve(auc, user_id, value, manual, now)
+        async with write_session() as session:
+            after = await auctions_collection.find_one_and_update(
+                {"_id": oid, "bid_seq": auc.get("bid_seq"), "proxy_rev": auc.get("proxy_rev")},
+                {
+                    "$set": {"current_price": price, "highest_bidder_id": leader, "proxy_top": proxy_top},
+                    "$inc": {"bid_seq": len(records), "bid_count": len(records), "proxy_rev": 1}
+                },
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if after is None:
+                continue  # ktoś zmienił aukcję między odczytem a zapisem
+
+            auction_cache.put(after)
+            if not auction_changes.running and records:
+                bid_broker.publish(auction_id, price_event(auction_id, after))
+
+            timestamp = datetime.utcnow()
+            seq_base = auc.get("bid_seq") or 0
+            written = []
+            for n, (bidder_id, amount) in enumerate(records, start=1):
+                written.append(await _write_bid_record({
+                    "auction_id": auction_id,
+                    "user_id": bidder_id,
+                    "amount": amount,
+                    "seq": seq_base + n,
+                    "timestamp": timestamp
+                }, session))
+            record_write(user_id, session)
+        return after, written
+    raise HTTPException(status_code=409, detail="Zbyt wiele równoległych ofert, spróbuj ponownie")
+
+
+async def apply_proxy_bid(auction_id: str, user_id: str, max_amount: float) -> dict:
+    """Ustawienie (lub podniesienie) oferty maksymalnej. Zwraca dokument aukcji po rozstrzygnięciu."""
+    auc, _ = await _apply_proxy(auction_id, user_id, max_amount, manual=False)
+    return auc
+
+
+async def apply_bid(auction_id: str, user_id: str, amount: float) -> dict:
+    """
+    Przyjęcie oferty bez transakcji.
+    - jedna atomowa aktualizacja warunkowa {_id, current_price < amount, ends_at > teraz},
+      która podnosi cenę, ustawia highest_bidder_id, zwiększa bid_count
+      i nadaje ofercie kolejny numer (bid_seq),
+    - dopiero potem idempotentny zapis dokumentu oferty.
+    Aukcje z aktywnymi ofertami maksymalnymi (proxy_top) nie pasują do filtra - ofertę
+    rozstrzyga wtedy _apply_proxy (możliwa automatyczna odpowiedź prowadzącego).
+    Oba zapisy idą w sesji przyczynowej, żeby odczyty z replik pokazały użytkownikowi jego ofertę.
+    Zwraca zapisany dokument oferty.
+    """
+    oid = _parse_auction_id(auction_id)
+    now = datetime.now()
+
+    async with write_session() as session:
+        auc = await auctions_collection.find_one_and_update(
+            # ends_at: None pasuje też do aukcji bez tego pola (bez terminu)
+            {"_id": oid, "current_price": {"$lt": amount}, "$or": [{"ends_at": None}, {"ends_at": {"$gt": now}}],
+             "proxy_top.0": {"$exists": False}},
+            {"$set": {"current_price": amount, "highest_bidder_id": user_id}, "$inc": {"bid_seq": 1, "bid_count": 1}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+
+        if auc is None:
+            if await _needs_proxy_path(auction_id, amount, now):
+                try:
+                    own = await _manual_proxy_bid(auction_id, user_id, amount)
+                except HTTPException:
+                    bids_total.inc(result="rejected")
+                    raise
+                bids_total.inc(result="accepted")
+                return own
+            bids_total.inc(result="rejected")
+            # Nie rozróżniamy tego w samym update - sprawdzamy tylko przy odrzuceniu
+            status_code, detail = await _rejection(auction_id, now)
+            raise HTTPException(status_code=status_code, detail=detail)
+
+        bids_total.inc(result="accepted")
+        auction_cache.put(auc)
+        if not auction_changes.running:
+            # Bez change streamu rozgłaszamy tylko w obrębie tego procesu
+            bid_broker.publish(auction_id, price_event(auction_id, auc))
+
+        bid_data = {
+            "auction_id": auction_id,
+            "user_id": user_id,
+            "amount": amount,
+            "seq": auc["bid_seq"],
+            "timestamp": datetime.utcnow()
+        }
+        new_bid = await _write_bid_record(bid_data, session)
+        record_write(user_id, session)
+    return new_bid
+
+
+async def _apply_group(auction_id: str, user_id: str, items: list) -> None:
+    """
+    Oferty jednego użytkownika na jedną aukcję (items: wyniki z polem amount, uzupełniane w miejscu).
+    Jedna aktualizacja warunkowa (pipeline) przyjmuje od razu wszystkie kwoty wyższe od bieżącej ceny:
+    cena = najwyższa kwota, bid_seq / bid_count rosną o liczbę przyjętych. Dokument sprzed zmiany
+    mówi, które kwoty przeszły i jakie numery seq dostały; dokumenty ofert idą jednym insert_many.
+    Każda grupa ma własną sesję przyczynową (sesji nie można używać współbieżnie).
+    """
+    now = datetime.now()
+    try:
+        oid = ObjectId(auction_id)
+    except (InvalidId, TypeError):
+        for item in items:
+            item["detail"] = "Nieprawidłowy identyfikator aukcji"
+        return
+
+    # Rosnąco, bez powtórzeń - kolejność, w jakiej oferty byłyby składane pojedynczo
+    amounts = sorted({item["amount"] for item in items})
+    top = amounts[-1]
+    accepted_count = {"$size": {"$filter": {"input": amounts, "cond": {"$gt": ["$$this", "$current_price"]}}}}
+    async with write_session() as session:
+        before = await auctions_collection.find_one_and_update(
+            {"_id": oid, "current_price": {"$lt": top}, "$or": [{"ends_at": None}, {"ends_at": {"$gt": now}}],
+             "proxy_top.0": {"$exists": False}},
+            [{"$set": {
+                "current_price": top,
+                "highest_bidder_id": {"$literal": user_id},
+                "bid_seq": {"$add": [{"$ifNull": ["$bid_seq", 0]}, accepted_count]},
+                "bid_count": {"$add": [{"$ifNull": ["$bid_count", 0]}, accepted_count]}
+            }}],
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+
+        if before is None:
+            if await _needs_proxy_path(auction_id, top, now):
+                # Oferty maksymalne na aukcji - kwoty po kolei, jak pojedyncze oferty
+                await _apply_group_with_proxies(auction_id, user_id, items, amounts)
+                return
+            _, detail = await _rejection(auction_id, now)
+            for item in items:
+                item["detail"] = detail
+            return
+
+        accepted = [amount for amount in amounts if amount > before["current_price"]]
+        seq_base = before.get("bid_seq", 0)
+        auc = {
+            **before,
+            "current_price": top,
+            "highest_bidder_id": user_id,
+            "bid_seq": seq_base + len(accepted),
+            "bid_count": before.get("bid_count", 0) + len(accepted)
+        }
+        auction_cache.put(auc)
+        if not auction_changes.running:
+            bid_broker.publish(auction_id, price_event(auction_id, auc))
+
+        timestamp = datetime.utcnow()
+        bid_docs = {
+            amount: {"_id": ObjectId(), "auction_id": auction_id, "user_id": user_id, "amount": amount,
+                     "seq": seq_base + n, "timestamp": timestamp}
+            for n, amount in enumerate(accepted, start=1)
+        }
+        try:
+            await bids_collection.insert_many(list(bid_docs.values()), ordered=False, session=session)
+        except PyMongoError:
+            # Częściowy zapis (np. błąd sieci) - dopisujemy brakujące idempotentnie, po kluczu (auction_id, seq)
+            for amount, doc in bid_docs.items():
+                bid_docs[amount] = await _write_bid_record({k: v for k, v in doc.items() if k != "_id"}, session)
+
+        for item in items:
+            doc = bid_docs.pop(item["amount"], None)  # powtórzona kwota - przyjęta tylko raz
+            if doc is None:
+                item["detail"] = "Kwota oferty musi być wyższa niż bieżąca cena"
+            else:
+                item["accepted"] = True
+                item["bid_id"] = str(doc["_id"])
+
+        record_write(user_id, session)
+
+
+
+async def _apply_group_with_proxies(auction_id: str, user_id: str, items: list, amounts: list) -> None:
+    outcomes = {}  # kwota -> (bid_id, None) albo (None, powód odrzucenia)
+    for amount in amounts:
+        try:
+            outcomes[amount] = (str((await _manual_proxy_bid(auction_id, user_id, amount))["_id"]), None)
+        except HTTPException as e:
+            outcomes[amount] = (None, e.detail)
+        except PyMongoError as e:
+            outcomes[amount] = (None, f"Błąd zapisu oferty: {e}")
+    for item in items:
+        # Powtórzona kwota - przyjęta tylko raz
+        bid_id, detail = outcomes.pop(item["amount"], (None, "Kwota oferty musi być wyższa niż bieżąca cena"))
+        item["accepted"] = bid_id is not None
+        item["bid_id"] = bid_id
+        item["detail"] = detail
+
+
+async def _apply_group_reporting(auction_id: str, user_id: str, items: list) -> None:
+    """
+    _apply_group z błędem zgłaszanym per oferta: inne grupy mogły już zostać zatwierdzone,
+    więc awaria jednej grupy nie może zamienić całej odpowiedzi w 500.
+    Oferty, które zdążyły zostać przyjęte, zachowują swój wynik.
+    """
+    try:
+        await _apply_group(auction_id, user_id, items)
+    except (PyMongoError, HTTPException) as e:
+        detail = e.detail if isinstance(e, HTTPException) else f"Błąd zapisu oferty: {e}"
+        for item in items:
+            if not item["accepted"] and item["detail"] is None:
+                item["detail"] = detail
+
+
+async def apply_bid_batch(user_id: str, bids: list) -> list:
+    """
+    Wiele ofert jednego użytkownika na wiele aukcji (bids: [{"auction_id", "amount"}, ...]).
+    Oferty są grupowane per aukcja, a grupy przetwarzane równolegle (_apply_group);
+    błąd grupy trafia do detail jej ofert, pozostałe wyniki są zwracane normalnie.
+    Zwraca wyniki w kolejności wejścia: {index, auction_id, amount, accepted, bid_id, detail}.
+    """
+    results = [
+        {"index": i, "auction_id": bid["auction_id"], "amount": bid["amount"], "accepted": False, "bid_id": None, "detail": None}
+        for i, bid in enumerate(bids)
+    ]
+    groups = {}
+    for result in results:
+        groups.setdefault(result["auction_id"], []).append(result)
+
+    await asyncio.gather(*(_apply_group_reporting(auction_id, user_id, items) for auction_id, items in groups.items()))
+
+    accepted = sum(1 for result in results if result["accepted"])
+    bids_total.inc(accepted, result="accepted")
+    bids_total.inc(len(results) - accepted, result="rejected")
+    return results
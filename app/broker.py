@@ -0,0 +1,105 @@
+import asyncio
+
+from config import STREAM_QUEUE_SIZE, STREAM_COALESCE_MS, STREAM_MAX_DROPS
+
+
+class Subscription:
+    """Subskrybent jednej aukcji: ograniczona kolejka zdarzeń + licznik zgubionych."""
+
+    def __init__(self, queue_size: int):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+
+
+class BidBroker:
+    """
+    Rozgłaszanie zmian cen aukcji do subskrybentów (SSE).
+    - temat = auction_id, każdy subskrybent ma własną ograniczoną kolejkę,
+    - szybkie zmiany są łączone: w oknie STREAM_COALESCE_MS wysyłamy tylko najnowszy stan,
+    - przy pełnej kolejce wyrzucamy najstarsze zdarzenie; subskrybent, który zgubił
+      więcej niż STREAM_MAX_DROPS zdarzeń, jest odłączany (wolny klient nie blokuje innych).
+    """
+
+    def __init__(self, queue_size: int, coalesce_ms: float, max_drops: int):
+        self.queue_size = queue_size
+        self.coalesce_seconds = coalesce_ms / 1000
+        self.max_drops = max_drops
+        self._topics = {}   # auction_id -> set(Subscription)
+        self._pending = {}  # auction_id -> najnowsze niewysłane zdarzenie
+        self.published = 0
+        self.delivered = 0
+        self.disconnected = 0
+
+    def subscribe(self, auction_id: str) -> Subscription:
+        sub = Subscription(self.queue_size)
+        self._topics.setdefault(auction_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, auction_id: str, sub: Subscription):
+        subs = self._topics.get(auction_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._topics[auction_id]
+
+    def publish(self, auction_id: str, event: dict):
+        if auction_id not in self._topics:
+            return
+        self.published += 1
+        scheduled = auction_id in self._pending
+        self._pending[auction_id] = event
+        if not scheduled:
+            asyncio.get_running_loop().call_later(self.coalesce_seconds, self._flush, auction_id)
+
+    def _flush(self, auction_id: str):
+        event = self._pending.pop(auction_id, None)
+        if event is None:
+            return
+        for sub in list(self._topics.get(auction_id, ())):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                sub.queue.get_nowait()
+                sub.queue.put_nowait(event)
+                sub.dropped += 1
+                if sub.dropped > self.max_drops:
+                    sub.closed = True
+                    self.disconnected += 1
+                    self.unsubscribe(auction_id, sub)
+                    continue
+            self.delivered += 1
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._topics),
+            "subscribers": sum(len(s) for s in self._topics.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "disconnected_slow_consumers": self.disconnected
+        }
+
+    def handle_change(self, change: dict):
+        """Odbiorca change streamu aukcji - zamienia zmianę dokumentu na zdarzenie."""
+        key = change.get("documentKey")
+        if not key:
+            return
+        auction_id = str(key["_id"])
+        if change["operationType"] == "update":
+            fields = change["updateDescription"]["updatedFields"]
+            if "current_price" in fields:
+                self.publish(auction_id, price_event(auction_id, fields))
+        elif change["operationType"] == "delete":
+            self.publish(auction_id, {"type": "closed", "auction_id": auction_id})
+
+
+def price_event(auction_id: str, auc: dict) -> dict:
+    return {
+        "type": "price",
+        "auction_id": auction_id,
+        "current_price": auc["current_price"],
+        "bid_seq": auc.get("bid_seq")
+    }
+
+
+bid_broker = BidBroker(STREAM_QUEUE_SIZE, STREAM_COALESCE_MS, STREAM_MAX_DROPS)
@@ -0,0 +1,118 @@
+import time
+from collections import OrderedDict
+from bson import ObjectId
+
+from config import AUCTION_CACHE_SIZE, AUCTION_CACHE_TTL_SECONDS
+from database import auctions_collection
+
+
+class AuctionCache:
+    """
+    Cache stanu aktywnych aukcji (LRU + TTL, ograniczona liczba wpisów).
+    - odczyty: get() -> trafienie w pamięci albo find_one i zapamiętanie,
+    - zapisy z place_bid / admin_edit_auction / close_auction przechodzą przez put() / invalidate(),
+    - change stream (change_feed, handle_change) unieważnia wpisy zmienione przez inne workery.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # auction_id -> (expires_at, doc)
+        self._generation = 0           # rośnie przy każdym unieważnieniu
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get(self, auction_id: str):
+        """Zwraca dokument aukcji (lub None). Rzuca InvalidId dla złego identyfikatora."""
+        entry = self._entries.get(auction_id)
+        if entry is not None:
+            expires_at, doc = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(auction_id)
+                self.hits += 1
+                return doc
+            del self._entries[auction_id]
+
+        self.misses += 1
+        generation = self._generation
+        doc = await auctions_collection.find_one({"_id": ObjectId(auction_id)})
+        # Jeśli w trakcie odczytu przyszło unieważnienie, nie zapamiętujemy wyniku
+        if doc is not None and generation == self._generation:
+            self.put(doc)
+        return doc
+
+    @staticmethod
+    def _version(doc: dict) -> tuple:
+        """Liczniki zmian dokumentu - każdy tylko rośnie (oferty, oferty maksymalne, edycje)."""
+        return doc.get("bid_seq") or 0, doc.get("proxy_rev") or 0, doc.get("rev") or 0
+
+    def put(self, doc: dict):
+        auction_id = str(doc["_id"])
+        entry = self._entries.get(auction_id)
+        if entry is not None:
+            # Równoległe oferty w jednym workerze - starszy dokument nie nadpisuje nowszego
+            cached = self._version(entry[1])
+            if any(new < old for new, old in zip(self._version(doc), cached)):
+                return
+        self._entries[auction_id] = (time.monotonic() + self.ttl_seconds, doc)
+        self._entries.move_to_end(auction_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, auction_id: str):
+        self._generation += 1
+        if self._entries.pop(auction_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    VERSION_FIELDS = ("bid_seq", "proxy_rev", "rev")
+
+    def _is_newer(self, change: dict, cached: dict) -> bool:
+        """
+        Czy zdarzenie opisuje stan nowszy niż wpis w cache. Własny zapis tego workera
+        (write-through w put) ma liczniki równe wpisowi - nie unieważniamy go.
+        Zmiana bez liczników (np. delete, replace, pole spoza wersji) - zawsze nowsza.
+        """
+        if change.get("operationType") != "update":
+            return True
+        fields = change.get("updateDescription", {}).get("updatedFields", {})
+        changed = [i for i, name in enumerate(self.VERSION_FIELDS) if name in fields]
+        if not changed:
+            return True
+        event = [fields[name] or 0 for name in self.VERSION_FIELDS if name in fields]
+        version = self._version(cached)
+        return any(value > version[i] for i, value in zip(changed, event))
+
+    def handle_change(self, change: dict):
+        """Odbiorca change streamu aukcji - unieważnia wpisy, od których zdarzenie jest nowsze (zapisy innych workerów)."""
+        key = change.get("documentKey")
+        if not key:
+            self.clear()
+            return
+        auction_id = str(key["_id"])
+        entry = self._entries.get(auction_id)
+        if entry is not None and not self._is_newer(change, entry[1]):
+            return
+        self.invalidate(auction_id)
+
+
+auction_cache = AuctionCache(AUCTION_CACHE_SIZE, AUCTION_CACHE_TTL_SECONDS)
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from pymongo.errors import PyMongoError
+
+from database import auctions_collection
+
+logger = logging.getLogger("auction_app")
+
+
+class ChangeFeed:
+    """
+    Jeden change stream kolekcji aukcji na proces, rozdzielany do wielu odbiorców
+    (cache aukcji, broker ofert, ...). Dzięki temu N odbiorców = jeden kursor w MongoDB.
+    - on_change(handler): handler(change) wywoływany dla każdej zmiany,
+    - on_reset(handler): handler() po (ponownym) podłączeniu - mogliśmy przegapić zmiany,
+    - version: licznik zmian kolekcji w tym procesie (rośnie przy każdej zmianie i ponownym
+      podłączeniu), last_time: clusterTime ostatniej zmiany - podstawa ETag listy aukcji.
+    Wymaga replica setu; na pojedynczym mongod kończy działanie (running = False).
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.running = False
+        self.version = 0
+        self.last_time = None
+        self._change_handlers = []
+        self._reset_handlers = []
+
+    def on_change(self, handler):
+        self._change_handlers.append(handler)
+
+    def on_reset(self, handler):
+        self._reset_handlers.append(handler)
+
+    def _dispatch(self, handlers, *args):
+        for handler in handlers:
+            try:
+                handler(*args)
+            except Exception:
+                logger.exception("Błąd odbiorcy change streamu")
+
+    async def run(self):
+        while True:
+            try:
+                async with self.collection.watch() as stream:
+                    self.running = True
+                    self.version += 1
+                    self._dispatch(self._reset_handlers)
+                    async for change in stream:
+                        self.version += 1
+                        self.last_time = change.get("clusterTime")
+                        self._dispatch(self._change_handlers, change)
+            except asyncio.CancelledError:
+                self.running = False
+                raise
+            except PyMongoError as e:
+                self.running = False
+                if getattr(e, "code", None) == 40573:  # change streams niedostępne (standalone)
+                    logger.warning("Change stream niedostępny - odbiorcy działają tylko lokalnie")
+                    return
+                logger.warning("Change stream aukcji przerwany: %s", e)
+                await asyncio.sleep(1)
+
+
+auction_changes = ChangeFeed(auctions_collection)
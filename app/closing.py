@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+from typing import Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+from database import auctions_collection, bids_collection, history_collection, get_client
+from summaries import record_closed_auction
+from cache import auction_cache
+from broker import bid_broker
+from change_feed import auction_changes
+from utils import log_action
+from archive import schedule_archive
+from metrics import auctions_closed_total, transaction_retries_total
+from consistency import record_write
+
+
+async def finalize_auction(auction_id: str, actor: Optional[dict] = None) -> dict:
+    """
+    Zamknięcie aukcji (przeniesienie do historii) w jednej krótkiej transakcji:
+    odczyt jednego dokumentu aukcji, wpis do historii i podsumowań, usunięcie aukcji.
+    Oferty są przenoszone do archiwum w tle, już po transakcji.
+    - actor: użytkownik zamykający (sprawdzamy, czy to właściciel lub admin);
+      None oznacza zamknięcie przez harmonogram po upływie ends_at.
+    Zwraca {"winner_id", "final_price"}. Rzuca HTTPException 400/403/404.
+    """
+    attempts = 0
+
+    async def close_in_transaction(session):
+        nonlocal attempts
+        attempts += 1
+        if attempts > 1:
+            transaction_retries_total.inc(operation="close_auction")
+        # Sprawdzenie czy aukcja istnieje
+        try:
+            auc = await auctions_collection.find_one({"_id": ObjectId(auction_id)}, session = session)
+        except:
+            raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator aukcji")
+        if not auc:
+            raise HTTPException(status_code=404, detail="Aukcja nie znaleziona")
+
+        # Sprawdzenie uprawnień
+        if actor is not None and auc["owner_id"] != str(actor["_id"]) and actor.get("role") != "admin":
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Brak uprawnień do zakończenia tej aukcji")
+
+        # Zwycięzca i cena są utrzymywane w dokumencie aukcji przy każdej ofercie (bid_engine)
+        if "bid_count" in auc:
+            winner_id = auc.get("highest_bidder_id")
+        else:
+            # Aukcje sprzed pola highest_bidder_id - jedna najwyższa oferta z indeksu
+            highest = await bids_collection.find_one(
+                {"auction_id": auction_id}, sort=[("amount", -1)], session = session
+            )
+            winner_id = highest["user_id"] if highest else None
+        final_price = auc["current_price"]
+
+        # Przygotowanie dokumentu do kolekcji history
+        history_doc = {
+            "auction_id": auction_id,
+            "title": auc["title"],
+            "description": auc.get("description"),
+            "owner_id": auc["owner_id"],
+            "created_at": auc["created_at"],
+            "closed_at": datetime.now(timezone.utc),
+            "closed_at_tz": "utc",  # starsze wpisy miały czas lokalny (migracja: summaries.migrate_closed_at_utc)
+            "winner_id": winner_id,
+            "final_price": final_price,
+            "bid_count": auc.get("bid_count"),
+            "bids_archived": False
+        }
+        await history_collection.insert_one(history_doc, session = session)
+        await record_closed_auction(history_doc, session = session)
+
+        # Usunięcie aukcji z aktywnych (oferty przenosi do archiwum zadanie w tle)
+        await auctions_collection.delete_one({"_id": ObjectId(auction_id)}, session = session)
+        return winner_id, final_price
+
+    # with_transaction ponawia transakcję przy konflikcie zapisu (np. z równoległą ofertą)
+    async with await get_client().start_session() as session:
+        winner_id, final_price = await session.with_transaction(close_in_transaction)
+        if actor is not None:
+            record_write(str(actor["_id"]), session)
+
+    # Po zatwierdzeniu transakcji
+    auctions_closed_total.inc(trigger="manual" if actor is not None else "scheduler")
+    auction_cache.invalidate(auction_id)
+    schedule_archive(auction_id)
+    if not auction_changes.running:
+        bid_broker.publish(auction_id, {"type": "closed", "auction_id": auction_id})
+
+    actor_id = str(actor["_id"]) if actor is not None else "system"
+    await log_action(actor_id, "close_auction", f"Zakończono aukcję {auction_id}")
+
+    return {"winner_id": winner_id, "final_price": final_price}
@@ -13,3 +13,91 @@ REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", 60
 # MongoDB
 MONGO_URL = os.getenv("MONGO_URL")
 DB_NAME = os.getenv("DB_NAME", "auction_db")
+
+# Pula połączeń klienta Motor
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0))  # 0 = bez limitu
+# Kompresja, np. "zstd,snappy" (zstd wymaga pakietu zstandard, snappy - python-snappy)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+# Raporty i katalog aukcji czytane z replik (secondaryPreferred); licytacje, zamykanie i logowanie - primary
+MONGO_SECONDARY_READS = os.getenv("MONGO_SECONDARY_READS", "true").lower() == "true"
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", 90))  # MongoDB wymaga min. 90
+
+# Licytacje
+BID_RECORD_RETRIES = int(os.getenv("BID_RECORD_RETRIES", 3))  # ponowienia zapisu dokumentu oferty
+BID_BATCH_MAX_SIZE = int(os.getenv("BID_BATCH_MAX_SIZE", 500))  # ofert w jednym POST /bids/batch
+BID_INCREMENT = float(os.getenv("BID_INCREMENT", 1.0))          # krok licytacji automatycznej (proxy)
+PROXY_CAS_RETRIES = int(os.getenv("PROXY_CAS_RETRIES", 10))     # ponowienia przy konflikcie zapisu (proxy)
+
+# Cache aukcji (w pamięci procesu)
+AUCTION_CACHE_SIZE = int(os.getenv("AUCTION_CACHE_SIZE", 1024))
+AUCTION_CACHE_TTL_SECONDS = float(os.getenv("AUCTION_CACHE_TTL_SECONDS", 30))
+
+# Eksport raportów (format ndjson/csv) - rozmiar paczki pobieranej z kursora
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+
+# Buforowany zapis logów operacji (kolekcja 'log')
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 200))
+LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", 1.0))
+LOG_OVERFLOW_POLICY = os.getenv("LOG_OVERFLOW_POLICY", "block")  # block | drop | spill
+LOG_SPILL_FILE = os.getenv("LOG_SPILL_FILE", "audit_spill.ndjson")
+
+# Czas przechowywania logów operacji (indeks TTL na log.timestamp)
+LOG_TTL_DAYS = int(os.getenv("LOG_TTL_DAYS", 90))
+
+# Uwierzytelnianie: "cached" - użytkownik z bazy przez krótki cache (z kontrolą token_version),
+# "stateless" - tylko podpisane claimy z JWT, bez odczytu z bazy
+AUTH_MODE = os.getenv("AUTH_MODE", "cached")
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 30))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+
+# Haszowanie haseł (bcrypt) w osobnej puli wątków
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", 4))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 32))  # oczekujące ponad rozmiar puli → 503
+
+# Change stream kolekcji aukcji (unieważnianie cache, rozgłaszanie cen między workerami)
+CHANGE_STREAM_ENABLED = os.getenv("CHANGE_STREAM_ENABLED", "true").lower() == "true"
+
+# Strumień cen aukcji (SSE)
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 16))           # kolejka zdarzeń na subskrybenta
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", 100))      # okno łączenia szybkich zmian
+STREAM_MAX_DROPS = int(os.getenv("STREAM_MAX_DROPS", 64))             # po tylu zgubionych - odłączenie
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", 15))
+
+# Harmonogram zamykania aukcji po upływie ends_at
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", 5))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", 100))
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", 30))
+
+# Cache HTTP raportów (Cache-Control max-age, okno ważności ETag)
+REPORT_CACHE_MAX_AGE = int(os.getenv("REPORT_CACHE_MAX_AGE", 30))
+# Raport /reports/timeseries - maksymalna liczba kubełków w jednym zapytaniu
+REPORT_TIMESERIES_MAX_BUCKETS = int(os.getenv("REPORT_TIMESERIES_MAX_BUCKETS", 5000))
+
+# Wyszukiwanie aukcji
+SEARCH_PRICE_BUCKETS = [float(b) for b in os.getenv("SEARCH_PRICE_BUCKETS", "0,100,500,1000,5000").split(",")]
+SEARCH_AUTOCOMPLETE_ENABLED = os.getenv("SEARCH_AUTOCOMPLETE_ENABLED", "true").lower() == "true"
+SEARCH_AUTOCOMPLETE_REBUILD_SECONDS = float(os.getenv("SEARCH_AUTOCOMPLETE_REBUILD_SECONDS", 60))  # bez change streamu
+
+# Archiwum ofert - liczba ofert w jednym dokumencie-kubełku
+BID_BUCKET_SIZE = int(os.getenv("BID_BUCKET_SIZE", 1000))
+
+# Metryki (GET /metrics): katalog na migawki workerów (pusty - tylko bieżący proces)
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 5))
+
+# Limity żądań (token bucket): polityka "tokeny na sekundę:pojemność"
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")  # memory | sqlite (wspólny dla workerów na hoście)
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "ratelimit.sqlite3")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"  # IP z X-Forwarded-For
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "0.2:10")               # per IP
+RATE_LIMIT_REGISTER = os.getenv("RATE_LIMIT_REGISTER", "0.05:5")         # per IP
+RATE_LIMIT_REFRESH = os.getenv("RATE_LIMIT_REFRESH", "1:10")             # per IP
+RATE_LIMIT_BID_USER = os.getenv("RATE_LIMIT_BID_USER", "5:10")           # per użytkownik
+RATE_LIMIT_BID_AUCTION = os.getenv("RATE_LIMIT_BID_AUCTION", "200:400")  # per aukcja (wszyscy licytujący)
+RATE_LIMIT_BID_BATCH = os.getenv("RATE_LIMIT_BID_BATCH", "1:5")          # per użytkownik (żądania /bids/batch)
@@ -0,0 +1,83 @@
+"""
+Spójność przyczynowa dla odczytów z replik ("widzę własną ofertę").
+- po zapisie użytkownika (oferta, zamknięcie, nowa aukcja) zapamiętujemy clusterTime
+  i operationTime sesji, w której zapis się wykonał,
+- odczyt z repliki dla tego użytkownika idzie w sesji przesuniętej do tych znaczników,
+  więc replika odpowie dopiero, gdy będzie zawierała jego zapis,
+- po MONGO_MAX_STALENESS_SECONDS wpis wygasa - wolniejsze repliki i tak nie są wybierane.
+Znaczniki trzymane są w pamięci procesu (ograniczony słownik, jak cache użytkowników).
+"""
+import time
+from contextlib import asynccontextmanager
+
+from config import MONGO_MAX_STALENESS_SECONDS, PRINCIPAL_CACHE_SIZE
+from database import get_client
+
+# user_id -> (expires_at, cluster_time, operation_time)
+_causal_tokens = {}
+
+
+def record_write(user_id: str, session):
+    """Zapamiętuje znaczniki czasu sesji, w której użytkownik właśnie coś zapisał."""
+    if session.operation_time is None:
+        return
+    previous = _causal_tokens.pop(user_id, None)
+    if previous is not None and previous[2] > session.operation_time:
+        # Równoległe zapisy tego samego użytkownika - zostawiamy późniejszy znacznik
+        _causal_tokens[user_id] = previous
+        return
+    if len(_causal_tokens) >= PRINCIPAL_CACHE_SIZE:
+        # Najstarszy wpis (kolejność wstawiania)
+        _causal_tokens.pop(next(iter(_causal_tokens)))
+    _causal_tokens[user_id] = (
+        time.monotonic() + MONGO_MAX_STALENESS_SECONDS, session.cluster_time, session.operation_time
+    )
+
+
+def causal_marker(user_id) -> str:
+    """Znacznik ostatniego świeżego zapisu użytkownika ("" gdy brak) - do ETag odczytów z repliki."""
+    entry = _causal_tokens.get(user_id) if user_id else None
+    if entry is None or entry[0] <= time.monotonic():
+        return ""
+    operation_time = entry[2]
+    return f"{operation_time.time}.{operation_time.inc}"
+
+
+@asynccontextmanager
+async def write_session():
+    """Sesja przyczynowa dla zapisów, po których użytkownik czyta z repliki."""
+    async with await get_client().start_session(causal_consistency=True) as session:
+        yield session
+
+
+async def open_read_session(user_id, after=None):
+    """
+    Sesja dla odczytu z repliki: przesunięta do ostatniego zapisu użytkownika
+    (oraz do operationTime `after`, np. ostatniej zmiany z change streamu)
+    albo None (brak świeżego zapisu - zwykły odczyt bez sesji). Sesję zamyka wywołujący (end_session).
+    """
+    entry = _causal_tokens.get(user_id) if user_id else None
+    if entry is not None and entry[0] <= time.monotonic():
+        entry = None
+    if entry is None and after is None:
+        return None
+    session = await get_client().start_session(causal_consistency=True)
+    if entry is not None:
+        _, cluster_time, operation_time = entry
+        if cluster_time is not None:
+            session.advance_cluster_time(cluster_time)
+        session.advance_operation_time(operation_time)
+    if after is not None:
+        session.advance_operation_time(after)
+    return session
+
+
+@asynccontextmanager
+async def read_session(user_id, after=None):
+    """open_read_session jako context manager."""
+    session = await open_read_session(user_id, after)
+    if session is None:
+        yield None
+        return
+    async with session:
+        yield session
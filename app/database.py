@@ -1,8 +1,26 @@
 import motor.motor_asyncio
+from pymongo.read_preferences import Primary, SecondaryPreferred
 from config import MONGO_URL, DB_NAME
+from config import MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_COMPRESSORS
+from config import MONGO_SECONDARY_READS, MONGO_MAX_STALENESS_SECONDS
+from db_metrics import pool_metrics, command_metrics
+
+# Ustawienia puli połączeń (konfigurowane w .env)
+client_options = {
+    "maxPoolSize": MONGO_MAX_POOL_SIZE,
+    "minPoolSize": MONGO_MIN_POOL_SIZE,
+    # Zawsze primary: transakcje (zamykanie, archiwizacja) i odczyty CAS tego wymagają;
+    # odczyty z replik tylko przez for_reads()
+    "readPreference": "primary",
+    "event_listeners": [pool_metrics, command_metrics],
+}
+if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+    client_options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+if MONGO_COMPRESSORS:
+    client_options["compressors"] = MONGO_COMPRESSORS
 
 # Inicjalizujemy asynchronicznego klienta Motor
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URL)
+client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URL, **client_options)
 
 # Wskazujemy konkretną bazę
 db = client[DB_NAME]
@@ -11,8 +29,37 @@ db = client[DB_NAME]
 users_collection = db["users"]              # Kolekcja users
 auctions_collection = db["auction"]         # Kolekcja aukcji
 bids_collection = db["auction.bids"]        # Kolekcja ofert (bids)
+bid_buckets_collection = db["auction.bids.buckets"]  # Archiwum ofert zakończonych aukcji (kubełki)
 history_collection = db["auction.history"]  # Kolekcja zakończonych aukcji (history)
 logs_collection = db["log"]                 # Kolekcja logów operacji
+sessions_collection = db["sessions"]        # Sesje (refresh tokeny, klucz: hash tokena)
+leases_collection = db["scheduler.leases"]  # Dzierżawy zadań w tle (jeden worker wykonuje zadanie)
+report_winners_collection = db["report.winners"]  # Podsumowania per zwycięzca (wydatki, wygrane)
+report_totals_collection = db["report.totals"]    # Podsumowania globalne (cashflow, zamknięte aukcje)
+report_timeseries_collection = db["report.timeseries"]  # Kubełki czasu zamknięć (minuta/godzina/dzień)
+
+# Odczyty, które mogą iść na repliki: raporty i katalog aukcji.
+# Replika opóźniona o więcej niż MONGO_MAX_STALENESS_SECONDS nie jest wybierana;
+# bez replik (lub przy MONGO_SECONDARY_READS=false) odczyt idzie na primary.
+# Licytacje, zamykanie aukcji i uwierzytelnianie używają zwykłych kolekcji (primary).
+replica_read_preference = (
+    SecondaryPreferred(max_staleness=MONGO_MAX_STALENESS_SECONDS) if MONGO_SECONDARY_READS else Primary()
+)
+
+
+def for_reads(collection):
+    """Ta sama kolekcja z odczytem z replik."""
+    return collection.with_options(read_preference=replica_read_preference)
+
+
+auctions_read_collection = for_reads(auctions_collection)
+bids_read_collection = for_reads(bids_collection)
+bid_buckets_read_collection = for_reads(bid_buckets_collection)
+history_read_collection = for_reads(history_collection)
+users_read_collection = for_reads(users_collection)
+report_winners_read_collection = for_reads(report_winners_collection)
+report_totals_read_collection = for_reads(report_totals_collection)
+report_timeseries_read_collection = for_reads(report_timeseries_collection)
 
 def get_client():
-    return client
\ No newline at end of file
+    return client
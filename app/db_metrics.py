@@ -0,0 +1,186 @@
+"""
+Metryki klienta MongoDB z nasłuchu zdarzeń pymongo (CMAP i komendy):
+- czas oczekiwania na połączenie z puli (checkout), połączenia w użyciu / otwarte,
+- histogram czasu wykonania per komenda (find, update, aggregate, ...).
+Listenery wywoływane są z wątków sterownika, stąd blokada przy aktualizacji.
+"""
+import threading
+import time
+from pymongo import monitoring
+
+# Granice kubełków histogramów [ms]
+LATENCY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # ostatni kubełek: +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float):
+        i = 0
+        while i < len(LATENCY_BUCKETS_MS) and value_ms > LATENCY_BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def snapshot(self) -> dict:
+        bounds = [str(b) for b in LATENCY_BUCKETS_MS] + ["+Inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets_ms": dict(zip(bounds, self.counts))
+        }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.open_connections = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self.checkout_wait = LatencyHistogram()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _checkout_wait_ms(self, event) -> float:
+        duration = getattr(event, "duration", None)  # pymongo >= 4.7
+        if duration is not None:
+            return duration * 1000
+        started = getattr(self._local, "started", None)
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def connection_checked_out(self, event):
+        wait_ms = self._checkout_wait_ms(event)
+        with self._lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.checkout_wait.observe(wait_ms)
+
+    def connection_check_out_failed(self, event):
+        wait_ms = self._checkout_wait_ms(event)
+        with self._lock:
+            self.checkout_failures += 1
+            self.checkout_wait.observe(wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "open_connections": self.open_connections,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "checkout_wait": self.checkout_wait.snapshot()
+            }
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}   # command_name -> LatencyHistogram
+        self.failures = {}  # command_name -> liczba błędów
+
+    def started(self, event):
+        pass
+
+    def _observe(self, event):
+        histogram = self.latency.get(event.command_name)
+        if histogram is None:
+            histogram = self.latency.setdefault(event.command_name, LatencyHistogram())
+        histogram.observe(event.duration_micros / 1000)
+
+    def succeeded(self, event):
+        with self._lock:
+            self._observe(event)
+
+    def failed(self, event):
+        with self._lock:
+            self._observe(event)
+            self.failures[event.command_name] = self.failures.get(event.command_name, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {**histogram.snapshot(), "failures": self.failures.get(name, 0)}
+                for name, histogram in sorted(self.latency.items())
+            }
+
+
+def _histogram_sample(histogram: LatencyHistogram) -> dict:
+    return {"counts": list(histogram.counts), "sum": histogram.sum_ms / 1000}
+
+
+def collect_mongo_metrics() -> dict:
+    """Kolektor dla /metrics (metrics.register_collector) - czasy w sekundach."""
+    buckets = [b / 1000 for b in LATENCY_BUCKETS_MS]
+    with pool_metrics._lock:
+        pool = [
+            ("mongo_pool_open_connections", "gauge", "Otwarte połączenia w puli", pool_metrics.open_connections),
+            ("mongo_pool_in_use_connections", "gauge", "Połączenia w użyciu", pool_metrics.in_use),
+            ("mongo_pool_checkout_failures_total", "counter", "Nieudane pobrania połączenia", pool_metrics.checkout_failures),
+            ("mongo_pool_clears_total", "counter", "Wyczyszczenia puli", pool_metrics.pool_clears),
+        ]
+        checkout_wait = _histogram_sample(pool_metrics.checkout_wait)
+    with command_metrics._lock:
+        commands = [[[name], _histogram_sample(h)] for name, h in command_metrics.latency.items()]
+        failures = [[[name], count] for name, count in command_metrics.failures.items()]
+
+    snapshot = {
+        name: {"type": kind, "help": help, "labelnames": [], "samples": [[[], value]]}
+        for name, kind, help, value in pool
+    }
+    snapshot["mongo_pool_checkout_wait_seconds"] = {
+        "type": "histogram", "help": "Czas oczekiwania na połączenie z puli [s]",
+        "labelnames": [], "buckets": buckets, "samples": [[[], checkout_wait]]
+    }
+    snapshot["mongo_command_duration_seconds"] = {
+        "type": "histogram", "help": "Czas wykonania komendy MongoDB [s]",
+        "labelnames": ["command"], "buckets": buckets, "samples": commands
+    }
+    snapshot["mongo_command_failures_total"] = {
+        "type": "counter", "help": "Nieudane komendy MongoDB",
+        "labelnames": ["command"], "samples": failures
+    }
+    return snapshot
+
+
+pool_metrics = PoolMetrics()
+command_metrics = CommandMetrics()
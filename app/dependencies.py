@@ -1,17 +1,51 @@
+import time
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from schemas import TokenData
-from config import SECRET_KEY, ALGORITHM
+from config import SECRET_KEY, ALGORITHM, AUTH_MODE, PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_SIZE
 from database import users_collection
 from bson import ObjectId
+from bson.errors import InvalidId
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+# Bez rosnących/wrażliwych pól - nie są potrzebne w handlerach
+PRINCIPAL_PROJECTION = {"refresh_tokens": 0, "hashed_password": 0}
+
+# user_id -> (expires_at, dokument użytkownika)
+_principal_cache = {}
+
+
+async def load_principal(user_id: str):
+    """Dokument użytkownika (bez refresh_tokens i hasła) przez krótki cache TTL."""
+    entry = _principal_cache.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+
+    user = await users_collection.find_one({"_id": ObjectId(user_id)}, projection=PRINCIPAL_PROJECTION)
+    if user is None:
+        _principal_cache.pop(user_id, None)
+        return None
+    if len(_principal_cache) >= PRINCIPAL_CACHE_SIZE:
+        # Najstarszy wpis (kolejność wstawiania)
+        _principal_cache.pop(next(iter(_principal_cache)))
+    _principal_cache[user_id] = (time.monotonic() + PRINCIPAL_CACHE_TTL_SECONDS, user)
+    return user
+
+
+def invalidate_principal(user_id: str):
+    _principal_cache.pop(user_id, None)
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
-    Weryfikuje JWT (access token) i zwraca dokument użytkownika z bazy.
+    Weryfikuje JWT (access token) i zwraca użytkownika.
+    - AUTH_MODE=stateless: tylko claimy z podpisanego tokena ({_id, role}), bez odczytu z bazy,
+    - AUTH_MODE=cached: dokument z bazy przez cache TTL; token z claimem "ver" niższym
+      niż token_version użytkownika jest unieważniony.
     Jeśli token jest nieprawidłowy lub użytkownik nie istnieje → 401.
     """
     credentials_exception = HTTPException(
@@ -26,15 +60,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         if user_id is None:
             raise credentials_exception
         token_data = TokenData(id=user_id, role=role)
-    except JWTError:
+        token_version = payload.get("ver", 0)
+        user_oid = ObjectId(token_data.id)
+    except (JWTError, InvalidId):
         raise credentials_exception
 
-    user = await users_collection.find_one({"_id": ObjectId(token_data.id)})
-    if user is None:
+    if AUTH_MODE == "stateless":
+        return {"_id": user_oid, "role": token_data.role}
+
+    user = await load_principal(token_data.id)
+    if user is None or token_version < user.get("token_version", 0):
         raise credentials_exception
     return user
 
 
+async def get_reader_id(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[str]:
+    """
+    Identyfikator użytkownika z tokena dla publicznych odczytów (bez odczytu z bazy, bez 401).
+    Służy tylko do wyboru sesji przyczynowej (consistency.read_session), nie do autoryzacji.
+    """
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
 async def get_current_active_user(current_user: dict = Depends(get_current_user)):
     """
     (Dopisek) Możesz tu ewentualnie sprawdzić, czy konto użytkownika jest aktywne.
@@ -48,7 +100,6 @@ async def get_current_admin(current_user: dict = Depends(get_current_user)):
     Sprawdzenie, czy zalogowany użytkownik ma rolę 'admin'.
     Jeśli nie → 403 Forbidden.
     """
-    print(current_user.get("role"))
     if current_user.get("role") != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Brak uprawnień administratora")
     return current_user
@@ -0,0 +1,78 @@
+"""
+Warunkowe GET (ETag / If-None-Match → 304) dla odczytów aukcji i raportów.
+- ETag liczony z wersji (bid_seq/rev dokumentu, licznik zmian z change streamu, okno czasu raportu),
+  więc 304 nie wymaga odczytu z MongoDB, gdy wersja jest znana w pamięci,
+- conditional() wywołujemy w handlerze / zależności po sprawdzeniu uprawnień:
+  przy zgodnym If-None-Match rzuca NotModified, inaczej zapamiętuje nagłówki w request.state,
+- CachedRoute (route_class routera) zamienia NotModified na pustą odpowiedź 304
+  i dokleja nagłówki do każdej odpowiedzi (również ORJSONResponse / StreamingResponse),
+- request.state.response_session: sesja odczytu zamykana dopiero po wysłaniu odpowiedzi
+  (strumień NDJSON/CSV czyta z kursora już po powrocie z handlera).
+"""
+import uuid
+from typing import Optional
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.background import BackgroundTasks
+
+# Wersje z liczników w pamięci są ważne tylko w obrębie jednego uruchomienia procesu
+INSTANCE = uuid.uuid4().hex[:8]
+
+
+class NotModified(Exception):
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    # Porównanie słabe (RFC 9110) - prefiks W/ nie ma znaczenia dla GET
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def conditional(request: Request, etag: str, cache_control: Optional[str] = None, vary: Optional[str] = None):
+    headers = {"ETag": etag}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    if vary:
+        headers["Vary"] = vary
+    if etag_matches(request, etag):
+        raise NotModified(headers)
+    request.state.cache_headers = headers
+
+
+def auction_etag(auc: dict) -> str:
+    """Wersja dokumentu aukcji: bid_seq (każda oferta) + rev (edycje administratora)."""
+    return f'"a-{auc["_id"]}-{auc.get("bid_seq") or 0}-{auc.get("rev") or 0}"'
+
+
+class CachedRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def cached_handler(request: Request) -> Response:
+            try:
+                response = await handler(request)
+            except NotModified as e:
+                return Response(status_code=304, headers=e.headers)
+            except BaseException:
+                session = getattr(request.state, "response_session", None)
+                if session is not None:
+                    await session.end_session()
+                raise
+            headers = getattr(request.state, "cache_headers", None)
+            if headers:
+                response.headers.update(headers)
+            session = getattr(request.state, "response_session", None)
+            if session is not None:
+                tasks = BackgroundTasks()
+                if response.background is not None:
+                    tasks.add_task(response.background)
+                tasks.add_task(session.end_session)
+                response.background = tasks
+            return response
+
+        return cached_handler
@@ -0,0 +1,161 @@
+"""
+Zarządzanie indeksami MongoDB.
+- INDEXES: wymagane indeksy per kolekcja (kolekcja, lista IndexModel), zakładane przy starcie aplikacji (ensure_indexes),
+- QUERY_SHAPES: kształty zapytań używanych w routerach, sprawdzane przez explain().
+
+Diagnostyka (kod wyjścia 1, jeśli którekolwiek zapytanie robi COLLSCAN):
+    python indexes.py verify
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from config import LOG_TTL_DAYS
+from database import db, users_collection, auctions_collection, bids_collection, history_collection, logs_collection
+from database import report_winners_collection, sessions_collection, bid_buckets_collection, report_timeseries_collection
+
+INDEXES = [
+    (users_collection, [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ]),
+    (auctions_collection, [
+        # Stronicowanie GET /auctions (keyset po created_at, _id) + filtr właściciela
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("owner_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Harmonogram zamykania (aukcje z upływającym ends_at)
+        IndexModel([("ends_at", ASCENDING)]),
+        # Wyszukiwanie GET /auctions/search - tytuł waży więcej niż opis;
+        # język "none": bez angielskiego stemmingu i stop-słów (treści są po polsku)
+        IndexModel(
+            [("title", TEXT), ("description", TEXT)],
+            weights={"title": 10, "description": 2},
+            default_language="none"
+        ),
+    ]),
+    (bids_collection, [
+        # Klucz idempotentnego zapisu ofert (partial - starsze oferty nie mają pola seq)
+        IndexModel(
+            [("auction_id", ASCENDING), ("seq", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"seq": {"$exists": True}}
+        ),
+        IndexModel([("auction_id", ASCENDING), ("amount", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+    ]),
+    (history_collection, [
+        IndexModel([("winner_id", ASCENDING)]),
+        IndexModel([("final_price", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("auction_id", ASCENDING)]),
+        # Zamknięcia, których oferty nie zostały jeszcze zarchiwizowane
+        IndexModel([("bids_archived", ASCENDING)], partialFilterExpression={"bids_archived": False}),
+    ]),
+    (bid_buckets_collection, [
+        IndexModel([("auction_id", ASCENDING), ("bucket", ASCENDING)]),
+        # Zakres czasu: kubełki z end_ts >= początek okna
+        IndexModel([("end_ts", ASCENDING), ("start_ts", ASCENDING)]),
+    ]),
+    (sessions_collection, [
+        IndexModel([("token_hash", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)]),
+        # TTL - wygasłe sesje usuwa sam MongoDB
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ]),
+    (report_winners_collection, [
+        IndexModel([("total_spent", DESCENDING)]),
+        IndexModel([("won_count", DESCENDING)]),
+    ]),
+    (report_timeseries_collection, [
+        # Jeden dokument na kubełek; zakres czasu w ramach ziarnistości
+        IndexModel([("granularity", ASCENDING), ("bucket", ASCENDING)], unique=True),
+    ]),
+    (logs_collection, [
+        # TTL - stare logi usuwa sam MongoDB
+        IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=LOG_TTL_DAYS * 24 * 3600),
+    ]),
+]
+
+
+def _sample_id():
+    return str(ObjectId())
+
+
+# (nazwa, kolekcja, rodzaj, zapytanie) - rodzaj "find": (filtr, sort), "aggregate": pipeline
+QUERY_SHAPES = [
+    ("users.by_email", users_collection, "find", ({"email": "x@example.com"}, None)),
+    ("sessions.by_token_hash", sessions_collection, "find", ({"token_hash": "0" * 64, "expires_at": {"$gt": datetime.now()}}, None)),
+    ("sessions.by_user", sessions_collection, "find", ({"user_id": _sample_id()}, None)),
+    ("auctions.list", auctions_collection, "find", ({}, [("created_at", -1), ("_id", -1)])),
+    ("auctions.list_by_owner", auctions_collection, "find", ({"owner_id": _sample_id()}, [("created_at", -1), ("_id", -1)])),
+    ("auctions.search", auctions_collection, "aggregate", [{"$match": {"$text": {"$search": "rower"}}}]),
+    ("auctions.due", auctions_collection, "find", ({"ends_at": {"$lte": datetime.now()}}, [("ends_at", 1)])),
+    ("bids.by_auction_seq", bids_collection, "find", ({"auction_id": _sample_id(), "seq": 1}, None)),
+    ("bids.by_auction", bids_collection, "find", ({"auction_id": _sample_id()}, None)),
+    ("bids.by_user", bids_collection, "find", ({"user_id": _sample_id()}, None)),
+    ("history.unarchived", history_collection, "find", ({"bids_archived": False}, None)),
+    ("bid_buckets.by_auction", bid_buckets_collection, "find", ({"auction_id": _sample_id()}, [("bucket", 1)])),
+    ("bid_buckets.range", bid_buckets_collection, "find", ({"end_ts": {"$gte": datetime.now()}, "start_ts": {"$lte": datetime.now()}}, None)),
+    ("history.winners", history_collection, "aggregate", [{"$match": {"winner_id": {"$ne": None}}}]),
+    ("history.high_value", history_collection, "aggregate", [{"$match": {"final_price": {"$gte": 1000.0}}}]),
+    ("report.timeseries.range", report_timeseries_collection, "find", ({"granularity": "hour", "bucket": {"$gte": datetime.now() - timedelta(days=7)}}, [("bucket", 1)])),
+    ("history.recent", history_collection, "aggregate", [{"$match": {"created_at": {"$gte": datetime.now() - timedelta(days=7)}}}]),
+]
+
+
+async def ensure_indexes():
+    """Tworzy indeksy wymagane przez aplikację (wywoływane przy starcie)."""
+    for collection, models in INDEXES:
+        await collection.create_indexes(models)
+
+
+def _plan_stages(node):
+    """Wszystkie etapy (stage) planu zwycięskiego - bez planów odrzuconych."""
+    if isinstance(node, dict):
+        if "stage" in node:
+            yield node["stage"]
+        for key, value in node.items():
+            if key not in ("rejectedPlans", "allPlansExecution"):
+                yield from _plan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _plan_stages(item)
+
+
+async def explain_shape(collection, kind, query) -> dict:
+    if kind == "find":
+        query_filter, sort = query
+        cursor = collection.find(query_filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        return await cursor.explain()
+    return await db.command("explain", {"aggregate": collection.name, "pipeline": query, "cursor": {}}, verbosity="queryPlanner")
+
+
+async def verify_query_plans() -> list:
+    """Zwraca nazwy kształtów zapytań, których plan zawiera COLLSCAN."""
+    failures = []
+    for name, collection, kind, query in QUERY_SHAPES:
+        plan = await explain_shape(collection, kind, query)
+        stages = set(_plan_stages(plan))
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"{name:28} {status:9} {', '.join(sorted(stages))}")
+        if status != "ok":
+            failures.append(name)
+    return failures
+
+
+async def main(command: str) -> int:
+    if command == "ensure":
+        await ensure_indexes()
+        return 0
+    if command == "verify":
+        failures = await verify_query_plans()
+        return 1 if failures else 0
+    print("Użycie: python indexes.py [ensure|verify]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "verify")))
@@ -1,4 +1,6 @@
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Importujemy routery
@@ -6,6 +8,20 @@ from routers import auth as auth_router
 from routers import users as users_router
 from routers import auctions as auctions_router
 from routers import reports as reports_router
+from routers import admin as admin_router
+from routers import bids as bids_router
+from indexes import ensure_indexes
+from cache import auction_cache
+from audit_log import audit_log
+from summaries import ensure_summaries
+from archive import archive_pending
+from change_feed import auction_changes
+from broker import bid_broker
+from scheduler import expiry_scheduler
+from metrics import MetricsMiddleware, register_collector, collect_all, run_exporter
+from db_metrics import collect_mongo_metrics
+from search import autocomplete
+from config import CHANGE_STREAM_ENABLED, SCHEDULER_ENABLED, SEARCH_AUTOCOMPLETE_ENABLED
 
 app = FastAPI(title="Aukcje Online API", version="1.0")
 
@@ -20,15 +36,60 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Metryki żądań per trasa (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+register_collector(collect_mongo_metrics)
 
 # Wpinamy routery
 app.include_router(auth_router.router)
 app.include_router(users_router.router)
 app.include_router(auctions_router.router)
+app.include_router(bids_router.router)
 app.include_router(reports_router.router)
+app.include_router(admin_router.router)
+
+# Zadania działające w tle przez cały czas życia aplikacji
+background_tasks = []
+
+
+@app.on_event("startup")
+async def startup():
+    await ensure_indexes()
+    await ensure_summaries()
+    background_tasks.append(asyncio.create_task(archive_pending()))
+    audit_log.start()
+    background_tasks.append(asyncio.create_task(run_exporter()))
+    if CHANGE_STREAM_ENABLED:
+        auction_changes.on_reset(auction_cache.clear)
+        auction_changes.on_change(auction_cache.handle_change)
+        auction_changes.on_change(bid_broker.handle_change)
+        if SEARCH_AUTOCOMPLETE_ENABLED:
+            auction_changes.on_reset(autocomplete.handle_reset)
+            auction_changes.on_change(autocomplete.handle_change)
+        background_tasks.append(asyncio.create_task(auction_changes.run()))
+    if SEARCH_AUTOCOMPLETE_ENABLED:
+        background_tasks.append(asyncio.create_task(autocomplete.run()))
+    if SCHEDULER_ENABLED:
+        background_tasks.append(asyncio.create_task(expiry_scheduler.run()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await audit_log.stop()
+
 
 @app.get("/")
 async def root():
     '''Prosty root endpoint do sprawdzenia czy API żyje'''
     return {"message": "Aukcje Online API jest dostępne."}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Metryki w formacie tekstowym Prometheus (suma wszystkich workerów przy METRICS_DIR)."""
+    return PlainTextResponse(collect_all(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,251 @@
+"""
+Metryki w formacie Prometheus (GET /metrics).
+- Counter / Gauge / Histogram z etykietami; aktualizacje to zwykłe operacje na słowniku
+  w pętli zdarzeń (jeden wątek) - bez blokad,
+- wiele workerów: każdy co METRICS_FLUSH_SECONDS zapisuje migawkę do METRICS_DIR/metrics-<pid>.json,
+  a /metrics sumuje migawki żyjących workerów (bez METRICS_DIR - tylko bieżący proces),
+- register_collector: dodatkowe źródła liczone przy odczycie (np. metryki puli MongoDB).
+"""
+import asyncio
+import glob
+import json
+import os
+import time
+
+from config import METRICS_DIR, METRICS_FLUSH_SECONDS
+
+# Granice kubełków czasu odpowiedzi [s]
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+_registry = []
+_collectors = []
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> dict:
+        return {
+            "type": self.type,
+            "help": self.help,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(key), value] for key, value in self._values.items()]
+        }
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: list = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = list(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            # counts[i] - obserwacje w kubełku i (niekumulatywnie), ostatni = +Inf
+            entry = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        entry["counts"][i] += 1
+        entry["sum"] += value
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "buckets": self.buckets}
+
+
+def register_collector(collector):
+    """collector() -> {nazwa: migawka metryki} (format jak Metric.snapshot)."""
+    _collectors.append(collector)
+
+
+def local_snapshot() -> dict:
+    snapshot = {metric.name: metric.snapshot() for metric in _registry}
+    for collector in _collectors:
+        snapshot.update(collector())
+    return snapshot
+
+
+def merge_snapshots(snapshots: list) -> dict:
+    """Sumuje migawki workerów (liczniki, wskaźniki i kubełki histogramów)."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif metric["type"] == "histogram":
+                    target["samples"][key] = {
+                        "counts": [a + b for a, b in zip(current["counts"], value["counts"])],
+                        "sum": current["sum"] + value["sum"]
+                    }
+                else:
+                    target["samples"][key] = current + value
+    return merged
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render(merged: dict) -> str:
+    lines = []
+    for name, metric in sorted(merged.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labelnames"]
+        for key, value in metric["samples"].items():
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, key)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ["+Inf"], value["counts"]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_labels(names, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, key)} {value['sum']}")
+            lines.append(f"{name}_count{_labels(names, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"metrics-{pid}.json")
+
+
+def write_snapshot():
+    """Zapis migawki bieżącego workera (atomowo: plik tymczasowy + rename)."""
+    path = _snapshot_path(os.getpid())
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(local_snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect_all() -> str:
+    """Tekst dla /metrics - suma wszystkich żyjących workerów (albo tylko bieżący proces)."""
+    if not METRICS_DIR:
+        return render(merge_snapshots([local_snapshot()]))
+    write_snapshot()
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "metrics-*.json")):
+        pid = int(os.path.basename(path)[len("metrics-"):-len(".json")])
+        if not _alive(pid):
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return render(merge_snapshots(snapshots))
+
+
+async def run_exporter():
+    """Okresowy zapis migawki workera (tylko gdy ustawiono METRICS_DIR)."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    try:
+        while True:
+            write_snapshot()
+            await asyncio.sleep(METRICS_FLUSH_SECONDS)
+    finally:
+        try:
+            os.remove(_snapshot_path(os.getpid()))
+        except OSError:
+            pass
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: liczba żądań, czas odpowiedzi i żądania w toku per trasa.
+    Trasa to szablon ścieżki (np. /auctions/{auction_id}), żeby nie mnożyć serii per identyfikator.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+        start = time.perf_counter()
+        http_requests_in_flight.inc(method=method)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            http_requests_in_flight.dec(method=method)
+            http_requests_total.inc(method=method, route=path, status=status["code"])
+            http_request_duration_seconds.observe(time.perf_counter() - start, method=method, route=path)
+
+
+# --- metryki HTTP ---
+http_requests_total = Counter("http_requests_total", "Liczba żądań HTTP", ("method", "route", "status"))
+http_request_duration_seconds = Histogram("http_request_duration_seconds", "Czas obsługi żądania HTTP [s]", ("method", "route"))
+http_requests_in_flight = Gauge("http_requests_in_flight", "Żądania HTTP w toku", ("method",))
+
+# --- metryki domenowe ---
+bids_total = Counter("auction_bids_total", "Oferty przyjęte i odrzucone", ("result",))
+bid_record_retries_total = Counter("auction_bid_record_retries_total", "Ponowienia zapisu dokumentu oferty")
+transaction_retries_total = Counter("auction_transaction_retries_total", "Ponowienia transakcji (konflikty zapisu)", ("operation",))
+auctions_closed_total = Counter("auction_closed_total", "Zamknięte aukcje", ("trigger",))
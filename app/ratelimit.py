@@ -0,0 +1,151 @@
+"""
+Limity żądań (token bucket) jako zależność FastAPI - 429 zanim żądanie dotknie MongoDB.
+- wiadro: pojemność `burst`, uzupełniane `rate` tokenów na sekundę; żądanie zużywa jeden token,
+- klucz: IP klienta, użytkownik (claim "sub" z tokena, bez odczytu z bazy) albo aukcja z ścieżki,
+- RATE_LIMIT_STORE=memory: wiadra w pamięci procesu (osobno w każdym workerze),
+  RATE_LIMIT_STORE=sqlite: wspólny plik sqlite dla workerów na jednym hoście
+  (operacja w puli wątków - czekanie na blokadę pliku nie zatrzymuje pętli zdarzeń).
+Użycie: @router.post(..., dependencies=[Depends(rate_limit("bid_user", "bid_auction"))])
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, status
+
+from config import RATE_LIMIT_ENABLED, RATE_LIMIT_STORE, RATE_LIMIT_SQLITE_PATH, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_TRUST_PROXY
+from config import RATE_LIMIT_LOGIN, RATE_LIMIT_REGISTER, RATE_LIMIT_REFRESH, RATE_LIMIT_BID_USER, RATE_LIMIT_BID_AUCTION
+from config import RATE_LIMIT_BID_BATCH
+from dependencies import get_reader_id
+from metrics import Counter
+
+rate_limited_total = Counter("rate_limited_total", "Żądania odrzucone przez limit (429)", ("policy",))
+
+
+class Policy:
+    def __init__(self, name: str, spec: str, key: str):
+        rate, burst = spec.split(":")
+        self.name = name
+        self.rate = float(rate)    # tokeny na sekundę
+        self.burst = float(burst)  # pojemność wiadra
+        self.key = key             # ip | user | auction
+
+
+POLICIES = {
+    policy.name: policy for policy in [
+        Policy("login", RATE_LIMIT_LOGIN, "ip"),
+        Policy("register", RATE_LIMIT_REGISTER, "ip"),
+        Policy("refresh", RATE_LIMIT_REFRESH, "ip"),
+        Policy("bid_user", RATE_LIMIT_BID_USER, "user"),
+        Policy("bid_auction", RATE_LIMIT_BID_AUCTION, "auction"),
+        Policy("bid_batch", RATE_LIMIT_BID_BATCH, "user"),
+    ]
+}
+
+
+def _refill(tokens: float, updated: float, now: float, policy: Policy):
+    """Stan wiadra po uzupełnieniu i próbie pobrania tokena: (tokens, retry_after lub 0)."""
+    tokens = min(policy.burst, tokens + (now - updated) * policy.rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / policy.rate if policy.rate > 0 else 60.0
+
+
+class MemoryStore:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = {}  # klucz -> (tokens, updated)
+
+    async def take(self, key: str, policy: Policy):
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (policy.burst, now))
+        tokens, retry_after = _refill(tokens, updated, now, policy)
+        if len(self._buckets) >= self.max_keys:
+            # Najdawniej używane wiadro (kolejność wstawiania) - usunięcie = pełne wiadro
+            self._buckets.pop(next(iter(self._buckets)))
+        self._buckets[key] = (tokens, now)
+        return retry_after
+
+
+class SqliteStore:
+    """
+    Wiadra we wspólnym pliku sqlite (WAL). Operacja to jedna krótka transakcja
+    BEGIN IMMEDIATE na lokalnym pliku, wykonywana w puli wątków (asyncio.to_thread):
+    przy rywalizacji workerów o blokadę (do 1 s, potem przepuszczamy żądanie)
+    czeka tylko to żądanie, nie cała pętla zdarzeń. Połączenie jest wspólne - dostęp pod blokadą.
+    """
+
+    CLEANUP_EVERY = 10000  # co tyle operacji usuwamy wiadra nieużywane od godziny
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+        self._ops = 0
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, policy: Policy):
+        return await asyncio.to_thread(self._take, key, policy)
+
+    def _take(self, key: str, policy: Policy):
+        with self._lock:
+            return self._take_locked(key, policy)
+
+    def _take_locked(self, key: str, policy: Policy):
+        now = time.time()  # zegar wspólny dla procesów
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            row = self._db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row is not None else (policy.burst, now)
+            tokens, retry_after = _refill(tokens, updated, now, policy)
+            self._db.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            self._ops += 1
+            if self._ops % self.CLEANUP_EVERY == 0:
+                self._db.execute("DELETE FROM buckets WHERE updated < ?", (now - 3600,))
+            self._db.execute("COMMIT")
+        except sqlite3.Error:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            return 0.0  # awaria magazynu nie blokuje ruchu
+        return retry_after
+
+
+store = SqliteStore(RATE_LIMIT_SQLITE_PATH) if RATE_LIMIT_STORE == "sqlite" else MemoryStore(RATE_LIMIT_MAX_KEYS)
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(*policy_names: str):
+    """Zależność sprawdzająca podane polityki po kolei. Przekroczenie → 429 z Retry-After."""
+    policies = [POLICIES[name] for name in policy_names]
+
+    async def check(request: Request, reader_id: Optional[str] = Depends(get_reader_id)):
+        if not RATE_LIMIT_ENABLED:
+            return
+        for policy in policies:
+            if policy.key == "user":
+                # Bez tokena - limit per IP (i tak skończy się 401)
+                subject = f"user:{reader_id}" if reader_id else f"ip:{client_ip(request)}"
+            elif policy.key == "auction":
+                subject = f"auction:{request.path_params.get('auction_id')}"
+            else:
+                subject = f"ip:{client_ip(request)}"
+            retry_after = await store.take(f"{policy.name}:{subject}", policy)
+            if retry_after > 0:
+                rate_limited_total.inc(policy=policy.name)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Zbyt wiele żądań, spróbuj ponownie za chwilę",
+                    headers={"Retry-After": str(math.ceil(retry_after))}
+                )
+
+    return check
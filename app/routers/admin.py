@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends
+from dependencies import get_current_admin
+from cache import auction_cache
+from broker import bid_broker
+from search import autocomplete
+from db_metrics import pool_metrics, command_metrics
+from database import client_options
+from audit_log import audit_log
+from summaries import rebuild_summaries
+from utils import log_action
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"]
+)
+
+
+@router.get("/cache-stats")
+async def cache_stats(admin: dict = Depends(get_current_admin)):
+    """
+    Liczniki cache aukcji (trafienia, chybienia, wyrzucenia) - do doboru rozmiaru.
+    Wartości dotyczą bieżącego procesu (workera).
+    """
+    return auction_cache.stats()
+
+
+@router.get("/db-metrics")
+async def db_metrics(admin: dict = Depends(get_current_admin)):
+    """
+    Metryki klienta MongoDB w bieżącym procesie: ustawienia i stan puli połączeń,
+    czas oczekiwania na połączenie (checkout) oraz histogramy czasu komend.
+    """
+    return {
+        "pool_options": {k: v for k, v in client_options.items() if k != "event_listeners"},
+        "pool": pool_metrics.snapshot(),
+        "commands": command_metrics.snapshot()
+    }
+
+
+@router.get("/stream-stats")
+async def stream_stats(admin: dict = Depends(get_current_admin)):
+    """
+    Stan brokera strumieni cen (tematy, subskrybenci, odłączeni wolni klienci) w bieżącym procesie.
+    """
+    return bid_broker.stats()
+
+
+@router.get("/search-stats")
+async def search_stats(admin: dict = Depends(get_current_admin)):
+    """
+    Stan indeksu podpowiedzi tytułów (liczba aukcji i słów, przebudowy) w bieżącym procesie.
+    """
+    return autocomplete.stats()
+
+
+@router.get("/audit-log-stats")
+async def audit_log_stats(admin: dict = Depends(get_current_admin)):
+    """
+    Stan kolejki logów operacji (zapisane, odrzucone, zrzucone do pliku) w bieżącym procesie.
+    """
+    return audit_log.stats()
+
+
+@router.post("/reports/rebuild")
+async def rebuild_report_summaries(admin: dict = Depends(get_current_admin)):
+    """
+    Przeliczenie zmaterializowanych podsumowań raportów (w tym kubełków /reports/timeseries)
+    od zera z auction.history.
+    Do naprawy rozjazdu liczników (np. po ręcznych zmianach w historii).
+    """
+    totals = await rebuild_summaries()
+    await log_action(str(admin["_id"]), "rebuild_reports", "Przebudowano podsumowania raportów")
+    return {"message": "Podsumowania zostały przebudowane", **totals}
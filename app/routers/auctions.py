@@ -1,21 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
-from typing import List
-from datetime import datetime
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import datetime, timedelta
 from bson import ObjectId
-from pymongo.errors import OperationFailure
 from bson.errors import InvalidId
-from asyncio import sleep
 
-from schemas import AuctionCreate, AuctionOut, BidCreate, BidOut
-from database import auctions_collection, bids_collection, history_collection, get_client
-from dependencies import get_current_active_user, get_current_admin
-from utils import log_action
+from schemas import AuctionCreate, AuctionOut, BidCreate, BidOut, ProxyBidCreate, ProxyBidOut, AuctionSearchOut, AutocompleteOut
+from database import auctions_collection, bids_collection, auctions_read_collection
+from dependencies import get_current_active_user, get_current_admin, get_reader_id
+from consistency import write_session, read_session, record_write, causal_marker
+from utils import log_action, encode_cursor, decode_cursor
+from bid_engine import apply_bid, apply_proxy_bid
+from cache import auction_cache
+from broker import bid_broker, price_event
+from closing import finalize_auction
+from config import STREAM_KEEPALIVE_SECONDS
+from ratelimit import rate_limit
+from serialization import ORJSONResponse, doc_out, AUCTION_FIELDS
+from search import search_auctions, autocomplete
+from change_feed import auction_changes
+from http_cache import CachedRoute, INSTANCE, conditional, auction_etag
 
 router = APIRouter(
     prefix="/auctions",
-    tags=["auctions"]
+    tags=["auctions"],
+    route_class=CachedRoute
 )
 
+# Tylko pola potrzebne do AuctionOut
+AUCTION_OUT_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "owner_id": 1,
+    "current_price": 1,
+    "created_at": 1,
+    "ends_at": 1
+}
+
 
 @router.post("", response_model=AuctionOut)
 async def create_auction(auction: AuctionCreate, current_user: dict = Depends(get_current_active_user)):
@@ -24,13 +47,23 @@ async def create_auction(auction: AuctionCreate, current_user: dict = Depends(ge
     - Ustawiamy owner_id na _id użytkownika w kolekcji.
     - current_price przyjmujemy jako starting_price.
     """
-    auction_data = auction.model_dump()
+    auction_data = auction.model_dump(exclude={"duration_minutes"})
     auction_data["owner_id"] = str(current_user["_id"])
     auction_data["current_price"] = auction.starting_price
+    auction_data["bid_seq"] = 0
+    auction_data["bid_count"] = 0
+    auction_data["highest_bidder_id"] = None
     auction_data["created_at"] = datetime.now()
+    # Termin zakończenia - aukcję zamknie harmonogram (scheduler.py)
+    auction_data["ends_at"] = (
+        auction_data["created_at"] + timedelta(minutes=auction.duration_minutes)
+        if auction.duration_minutes else None
+    )
 
-    result = await auctions_collection.insert_one(auction_data)
-    new_auc = await auctions_collection.find_one({"_id": result.inserted_id})
+    async with write_session() as session:
+        result = await auctions_collection.insert_one(auction_data, session=session)
+        new_auc = await auctions_collection.find_one({"_id": result.inserted_id}, session=session)
+        record_write(str(current_user["_id"]), session)
 
     await log_action(str(current_user["_id"]), "create_auction", f"Aukcja utworzona: {new_auc['title']}")
 
@@ -40,109 +73,232 @@ async def create_auction(auction: AuctionCreate, current_user: dict = Depends(ge
         description=new_auc.get("description"),
         owner_id=new_auc["owner_id"],
         current_price=new_auc["current_price"],
-        created_at=new_auc["created_at"]
+        created_at=new_auc["created_at"],
+        ends_at=new_auc.get("ends_at")
     )
 
 
+def _auction_filters(min_price, max_price, owner_id, created_from, created_to) -> list:
+    """Warunki filtrów listy / wyszukiwania: zakres ceny, właściciel, okno created_at."""
+    conditions = []
+    if min_price is not None or max_price is not None:
+        price = {}
+        if min_price is not None:
+            price["$gte"] = min_price
+        if max_price is not None:
+            price["$lte"] = max_price
+        conditions.append({"current_price": price})
+    if owner_id is not None:
+        conditions.append({"owner_id": owner_id})
+    if created_from is not None or created_to is not None:
+        created = {}
+        if created_from is not None:
+            created["$gte"] = created_from
+        if created_to is not None:
+            created["$lt"] = created_to
+        conditions.append({"created_at": created})
+    return conditions
+
+
 @router.get("", response_model=List[AuctionOut])
-async def list_active_auctions():
+async def list_active_auctions(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    owner_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    reader_id: Optional[str] = Depends(get_reader_id)
+):
     """
-    Lista wszystkich aktywnych aukcji.
+    Lista aktywnych aukcji, od najnowszych, stronicowana kursorem (keyset po created_at, _id).
+    - token kolejnej strony zwracany jest w nagłówku X-Next-Cursor (brak nagłówka = ostatnia strona),
+    - filtry: zakres ceny, właściciel, okno created_at,
+    - odczyt z repliki; zalogowany użytkownik widzi swoje świeże zapisy (sesja przyczynowa),
+    - odpowiedź serializowana bezpośrednio przez orjson (bez modeli per dokument),
+    - przy działającym change streamie ETag = licznik zmian kolekcji (+ ostatni zapis czytelnika);
+      zgodny If-None-Match → 304 bez zapytania do MongoDB.
     """
-    cursor = auctions_collection.find()
-    auctions = []
-    async for auc in cursor:
-        auctions.append(AuctionOut(
-            id=str(auc["_id"]),
-            title=auc["title"],
-            description=auc.get("description"),
-            owner_id=auc["owner_id"],
-            current_price=auc["current_price"],
-            created_at=auc["created_at"]
-        ))
-    return auctions
+    after = None
+    if auction_changes.running:
+        version = f"{INSTANCE}-{auction_changes.version}"
+        marker = causal_marker(reader_id)
+        if marker:
+            version += f"-{marker}"
+        conditional(request, f'"c-{version}"', cache_control="no-cache", vary="Authorization")
+        # Replika musi zawierać co najmniej zmiany, które opisuje ETag
+        after = auction_changes.last_time
+    conditions = _auction_filters(min_price, max_price, owner_id, created_from, created_to)
+    if cursor is not None:
+        try:
+            last_created_at, last_id = decode_cursor(cursor)
+            last_id = ObjectId(last_id)
+        except (ValueError, TypeError, InvalidId):
+            raise HTTPException(status_code=400, detail="Nieprawidłowy token kursora")
+        conditions.append({"$or": [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": last_created_at, "_id": {"$lt": last_id}}
+        ]})
+
+    query = {"$and": conditions} if conditions else {}
+    async with read_session(reader_id, after=after) as session:
+        docs = await auctions_read_collection.find(query, projection=AUCTION_OUT_PROJECTION, session=session) \
+            .sort([("created_at", -1), ("_id", -1)]) \
+            .limit(limit + 1) \
+            .to_list(length=limit + 1)
+
+    headers = {}
+    if len(docs) > limit:
+        # Jest co najmniej jeszcze jeden dokument → wystawiamy token
+        last = docs[limit - 1]
+        headers["X-Next-Cursor"] = encode_cursor(last["created_at"], str(last["_id"]))
+    return ORJSONResponse([doc_out(auc, AUCTION_FIELDS) for auc in docs[:limit]], headers=headers)
+
+
+
+@router.get("/search", response_model=AuctionSearchOut)
+async def search_auctions_endpoint(
+    q: Optional[str] = Query(None, max_length=200),
+    page: int = Query(1, ge=1, le=500),
+    page_size: int = Query(20, ge=1, le=100),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    owner_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None
+):
+    """
+    Wyszukiwanie pełnotekstowe aktywnych aukcji (tytuł waży więcej niż opis), od najtrafniejszych.
+    Te same filtry co lista, stronicowanie page/page_size, fasety ceny i daty dodania
+    (liczone dla całego wyniku, nie tylko strony). Bez q - same filtry, od najnowszych.
+    """
+    conditions = _auction_filters(min_price, max_price, owner_id, created_from, created_to)
+    result = await search_auctions(q, conditions, page, page_size)
+    result["items"] = [{**doc_out(doc, AUCTION_FIELDS), "score": doc.get("score")} for doc in result["items"]]
+    return ORJSONResponse(result)
 
 
+@router.get("/autocomplete", response_model=List[AutocompleteOut])
+async def autocomplete_auctions(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50)):
+    """
+    Podpowiedzi tytułów po prefiksie (np. "rower gó") z indeksu w pamięci procesu.
+    Gdy indeks jest wyłączony lub jeszcze się ładuje - wyszukiwanie pełnotekstowe po całych słowach.
+    """
+    if autocomplete.ready:
+        return ORJSONResponse(autocomplete.suggest(q, limit))
+    result = await search_auctions(q, [], 1, limit)
+    return ORJSONResponse([{"id": str(doc["_id"]), "title": doc["title"]} for doc in result["items"]])
+
 @router.get("/{auction_id}", response_model=AuctionOut)
-async def get_auction(auction_id: str):
+async def get_auction(auction_id: str, request: Request):
     """
     Szuka aukcji po podanym ID. Jeśli nie ma → 404.
+    ETag z wersji dokumentu w cache (bid_seq, rev) - 304 bez odczytu z MongoDB przy trafieniu w cache.
     """
     try:
-        auc = await auctions_collection.find_one({"_id": ObjectId(auction_id)})
+        auc = await auction_cache.get(auction_id)
     except:
         raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator aukcji")
     if not auc:
         raise HTTPException(status_code=404, detail="Aukcja nie znaleziona")
+    conditional(request, auction_etag(auc), cache_control="no-cache")
     return AuctionOut(
         id=str(auc["_id"]),
         title=auc["title"],
         description=auc.get("description"),
         owner_id=auc["owner_id"],
         current_price=auc["current_price"],
-        created_at=auc["created_at"]
+        created_at=auc["created_at"],
+        ends_at=auc.get("ends_at")
     )
 
-@router.post("/{auction_id}/bid", response_model=BidOut)
+@router.get("/{auction_id}/stream")
+async def stream_auction(auction_id: str):
+    """
+    Strumień zmian ceny aukcji (Server-Sent Events).
+    - na start: zdarzenie "price" z bieżącym stanem,
+    - potem "price" po każdej przyjętej ofercie (szybkie zmiany są łączone),
+    - "closed" po zakończeniu aukcji (koniec strumienia).
+    Zdarzenia pochodzą z jednego change streamu na worker, nie z odpytywania bazy.
+    """
+    try:
+        auc = await auction_cache.get(auction_id)
+    except:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator aukcji")
+    if not auc:
+        raise HTTPException(status_code=404, detail="Aukcja nie znaleziona")
+
+    sub = bid_broker.subscribe(auction_id)
+
+    async def events():
+        try:
+            yield f"event: price\ndata: {json.dumps(price_event(auction_id, auc))}\n\n"
+            while not sub.closed:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event["type"] == "closed":
+                    return
+        finally:
+            bid_broker.unsubscribe(auction_id, sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/{auction_id}/bid", response_model=BidOut, dependencies=[Depends(rate_limit("bid_user", "bid_auction"))])
 async def place_bid(
     auction_id: str,
     bid: BidCreate,
     current_user: dict = Depends(get_current_active_user)
 ):
-    for attempt in range(5):
-        try:
-            async with await get_client().start_session() as session:
-                async with session.start_transaction():
-                    try:
-                        auc = await auctions_collection.find_one(
-                            {"_id": ObjectId(auction_id)}, 
-                            session=session
-                        )
-                    except InvalidId:
-                        raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator aukcji")
-
-                    if not auc:
-                        raise HTTPException(status_code=404, detail="Aukcja nie znaleziona")
-
-                    if bid.amount <= auc["current_price"]:
-                        raise HTTPException(status_code=400, detail="Kwota oferty musi być wyższa niż bieżąca cena")
-
-                    await auctions_collection.update_one(
-                        {"_id": ObjectId(auction_id)},
-                        {"$set": {"current_price": bid.amount}},
-                        session=session
-                    )
-
-                    bid_data = {
-                        "auction_id": auction_id,
-                        "user_id": str(current_user["_id"]),
-                        "amount": bid.amount,
-                        "timestamp": datetime.utcnow()
-                    }
-                    result = await bids_collection.insert_one(bid_data, session=session)
-                    new_bid = await bids_collection.find_one({"_id": result.inserted_id}, session=session)
-
-                    await log_action(str(current_user["_id"]), "bid", f"Oferta {bid.amount} na aukcji {auction_id}")
-
-                    return BidOut(
-                        id=str(new_bid["_id"]),
-                        auction_id=new_bid["auction_id"],
-                        user_id=new_bid["user_id"],
-                        amount=new_bid["amount"],
-                        timestamp=new_bid["timestamp"]
-                    )
-        except HTTPException:
-            raise
-        except OperationFailure as e:
-            if "TransientTransactionError" in str(e) or e.has_error_label("TransientTransactionError"):
-                if attempt == 4:
-                    raise HTTPException(status_code=500, detail="Przekroczono maksymalną liczbę prób transakcji")
-                await sleep(0.1)
-                continue
-            else:
-                raise HTTPException(status_code=500, detail=f"Błąd serwera: {str(e)}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Błąd serwera: {str(e)}")
+    """
+    Złożenie oferty. Cena podnoszona jest jedną atomową aktualizacją warunkową
+    (bez transakcji i bez ponowień) - patrz bid_engine.apply_bid.
+    """
+    new_bid = await apply_bid(auction_id, str(current_user["_id"]), bid.amount)
+
+    await log_action(str(current_user["_id"]), "bid", f"Oferta {bid.amount} na aukcji {auction_id}")
+
+    return BidOut(
+        id=str(new_bid["_id"]),
+        auction_id=new_bid["auction_id"],
+        user_id=new_bid["user_id"],
+        amount=new_bid["amount"],
+        timestamp=new_bid["timestamp"]
+    )
+
+
+@router.post("/{auction_id}/proxy-bid", response_model=ProxyBidOut, dependencies=[Depends(rate_limit("bid_user", "bid_auction"))])
+async def place_proxy_bid(
+    auction_id: str,
+    bid: ProxyBidCreate,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Oferta maksymalna (licytacja automatyczna): serwer przebija konkurencyjne oferty
+    o BID_INCREMENT aż do podanego limitu. Limitu nie można obniżyć.
+    Maksima innych użytkowników nie są ujawniane - tylko cena i to, czy prowadzisz.
+    """
+    user_id = str(current_user["_id"])
+    auc = await apply_proxy_bid(auction_id, user_id, bid.max_amount)
+
+    await log_action(user_id, "proxy_bid", f"Oferta maksymalna {bid.max_amount} na aukcji {auction_id}")
+
+    return ProxyBidOut(
+        auction_id=auction_id,
+        max_amount=bid.max_amount,
+        current_price=auc["current_price"],
+        leading=auc.get("highest_bidder_id") == user_id
+    )
 
 
 @router.post("/{auction_id}/close")
@@ -155,60 +311,14 @@ async def close_auction(
     Tylko:
     - właściciel aukcji (owner_id) lub
     - administrator.
+    Aukcje z ends_at zamyka też automatycznie harmonogram (ta sama logika - closing.finalize_auction).
     """
+    result = await finalize_auction(auction_id, current_user)
+    return {
+        "message": "Aukcja została zakończona",
+        **result
+    }
 
-    async with await get_client().start_session() as session:
-        async with session.start_transaction():
-            # Sprawdzenie czy aukcja istnieje
-            try:
-                auc = await auctions_collection.find_one({"_id": ObjectId(auction_id)}, session = session)
-            except:
-                raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator aukcji")
-            if not auc:
-                raise HTTPException(status_code=404, detail="Aukcja nie znaleziona")
-
-            # Sprawdzenie uprawnień
-            if auc["owner_id"] != str(current_user["_id"]) and current_user.get("role") != "admin":
-                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Brak uprawnień do zakończenia tej aukcji")
-
-            # Pobranie wszystkich ofert z bids_collection
-            bids_cursor = bids_collection.find({"auction_id": auction_id}, session = session)
-            bids_list = []
-            async for b in bids_cursor:
-                bids_list.append(b)
-
-            # Ustalenie zwycięzcy:
-            if bids_list:
-                highest = max(bids_list, key=lambda x: x["amount"])
-                winner_id = highest["user_id"]
-                final_price = highest["amount"]
-            else:
-                winner_id = None
-                final_price = auc["current_price"]
-
-            # Przygotowanie dokumentu do kolekcji history
-            history_doc = {
-                "title": auc["title"],
-                "description": auc.get("description"),
-                "owner_id": auc["owner_id"],
-                "created_at": auc["created_at"],
-                "closed_at": datetime.now(),
-                "winner_id": winner_id,
-                "final_price": final_price
-            }
-            await history_collection.insert_one(history_doc, session = session)
-
-            # Usunięcie aukcji z aktywnych + usunięcie jej oferty z bids_collection
-            await auctions_collection.delete_one({"_id": ObjectId(auction_id)}, session = session)
-            await bids_collection.delete_many({"auction_id": auction_id}, session = session)
-
-            await log_action(str(current_user["_id"]), "close_auction", f"Zakończono aukcję {auction_id}")
-
-            return {
-                "message": "Aukcja została zakończona",
-                "winner_id": winner_id,
-                "final_price": final_price
-            }
 
 @router.patch("/{auction_id}", response_model=AuctionOut)
 async def admin_edit_auction(
@@ -241,17 +351,22 @@ async def admin_edit_auction(
         raise HTTPException(status_code=404, detail="Aukcja nie znaleziona")
 
     # Jeśli są oferty zablokuj zmianę starting_price
-    has_bids = await bids_collection.find_one({"auction_id": auction_id})
+    if "bid_count" in auc:
+        has_bids = auc["bid_count"] > 0
+    else:
+        # Aukcje sprzed licznika bid_count
+        has_bids = await bids_collection.find_one({"auction_id": auction_id})
     if "starting_price" in updates and has_bids:
         raise HTTPException(status_code=400, detail="Nie można zmienić ceny startowej - są już oferty")
 
     # Aktualizacja
     await auctions_collection.update_one(
         {"_id": ObjectId(auction_id)},
-        {"$set": updates}
+        {"$set": updates, "$inc": {"rev": 1}}  # rev - wersja treści do ETag
     )
 
     updated = await auctions_collection.find_one({"_id": ObjectId(auction_id)})
+    auction_cache.put(updated)
 
     await log_action(str(current_admin["_id"]), "edit_auction", f"Edytowano aukcję {auction_id}")
 
@@ -261,5 +376,6 @@ async def admin_edit_auction(
         description=updated.get("description"),
         owner_id=updated["owner_id"],
         current_price=updated["current_price"],
-        created_at=updated["created_at"]
+        created_at=updated["created_at"],
+        ends_at=updated.get("ends_at")
     )
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from schemas import UserCreate, UserOut, Token, TokenRefreshRequest
-from database import users_collection
-from utils import get_password_hash, verify_password, create_access_token, create_refresh_token, log_action
-from dependencies import get_current_user
+from pymongo import ReturnDocument
 from bson import ObjectId
-from datetime import timedelta
+from bson.errors import InvalidId
+from database import users_collection, sessions_collection
+from utils import get_password_hash_async, verify_password_async, create_access_token, create_refresh_token, log_action, hash_token
+from dependencies import get_current_user
+from ratelimit import rate_limit
+from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_MINUTES
 
@@ -15,7 +18,7 @@ router = APIRouter(
 )
 
 
-@router.post("/register", response_model=UserOut)
+@router.post("/register", response_model=UserOut, dependencies=[Depends(rate_limit("register"))])
 async def register(user: UserCreate):
     """
     Rejestracja nowego użytkownika.
@@ -29,11 +32,10 @@ async def register(user: UserCreate):
         raise HTTPException(status_code=400, detail="Użytkownik o takim adresie email już istnieje")
 
     # Hashujemy hasło i tworzymy obiekt do zapisania
-    hashed_pw = get_password_hash(user.password)
+    hashed_pw = await get_password_hash_async(user.password)
     user_dict = user.model_dump()
     user_dict["hashed_password"] = hashed_pw
     user_dict["role"] = "user"     # domyślna rola
-    user_dict["refresh_tokens"] = []
     del user_dict["password"]
 
     # Zapis do bazy
@@ -51,34 +53,38 @@ async def register(user: UserCreate):
     )
 
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(rate_limit("login"))])
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Logowanie użytkownika. Używamy fieldów:
     - username (przechowujemy tam email),
     - password.
-    Generujemy access i refresh token, zapisujemy refresh_token w bazie.
+    Generujemy access i refresh token, zapisujemy sesję (skrót refresh_token) w kolekcji sessions.
     """
     # Pobierz user po emailu
     user = await users_collection.find_one({"email": form_data.username})
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    if not user or not await verify_password_async(form_data.password, user["hashed_password"]):
         raise HTTPException(status_code=400, detail="Nieprawidłowy email lub hasło")
 
-    # Stwórz tokeny
+    # Stwórz tokeny ("ver" - wersja tokenów użytkownika, podbijana przy unieważnieniu)
+    claims = {"sub": str(user["_id"]), "role": user["role"], "ver": user.get("token_version", 0)}
     access_token = create_access_token(
-        data={"sub": str(user["_id"]), "role": user["role"]},
+        data=claims,
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     refresh_token = create_refresh_token(
-        data={"sub": str(user["_id"]), "role": user["role"]},
+        data=claims,
         expires_delta=timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
     )
 
-    # Zapisz refresh_token w bazie
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$push": {"refresh_tokens": refresh_token}}
-    )
+    # Zapisz sesję - wygasłe usuwa indeks TTL na expires_at
+    now = datetime.now(timezone.utc)
+    await sessions_collection.insert_one({
+        "token_hash": hash_token(refresh_token),
+        "user_id": str(user["_id"]),
+        "created_at": now,
+        "expires_at": now + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
+    })
 
     # Zaloguj akcję
     await log_action(str(user["_id"]), "login", "Użytkownik zalogowany")
@@ -86,11 +92,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
-@router.post("/token/refresh", response_model=Token)
+@router.post("/token/refresh", response_model=Token, dependencies=[Depends(rate_limit("refresh"))])
 async def refresh_access_token(body: TokenRefreshRequest):
     """
     Odświeżenie tokena: klient podaje refresh_token.
-    Sprawdzamy, czy token jest ważny i czy znajduje się w liście refresh_tokens u użytkownika.
+    Sprawdzamy podpis tokena, a sesję rotujemy jednym atomowym find_one_and_update
+    po skrócie tokena (stary token przestaje działać, nowy go zastępuje).
+    Rola i wersja tokenów są czytane z dokumentu użytkownika (zmiana roli działa od następnego odświeżenia).
+    Tokeny sprzed kolekcji sessions (tablica users.refresh_tokens) są przy pierwszym użyciu
+    usuwane z tablicy i zastępowane sesją - jednorazowa migracja bez wylogowania użytkownika.
     """
     try:
         payload = jwt.decode(body.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -100,31 +110,54 @@ async def refresh_access_token(body: TokenRefreshRequest):
     except JWTError:
         raise HTTPException(status_code=401, detail="Nieprawidłowy token odświeżania")
 
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user or body.refresh_token not in user.get("refresh_tokens", []):
+    try:
+        user_oid = ObjectId(user_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=401, detail="Nieprawidłowy token odświeżania")
+    user = await users_collection.find_one({"_id": user_oid}, projection={"role": 1, "token_version": 1})
+    if user is None or payload.get("ver", 0) < user.get("token_version", 0):
         raise HTTPException(status_code=401, detail="Nieprawidłowy token odświeżania")
 
-    # Tworzymy nowe tokeny
+    # Tworzymy nowe tokeny - rola i wersja z bieżącego dokumentu użytkownika
+    claims = {"sub": user_id, "role": user["role"], "ver": user.get("token_version", 0)}
     new_access = create_access_token(
-        data={"sub": str(user["_id"]), "role": user["role"]},
+        data=claims,
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     new_refresh = create_refresh_token(
-        data={"sub": str(user["_id"]), "role": user["role"]},
+        data=claims,
         expires_delta=timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
     )
 
-    # Usuwamy stary refresh_token i dodajemy nowy
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$pull": {"refresh_tokens": body.refresh_token}}
-    )
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$push": {"refresh_tokens": new_refresh}}
+    # Rotacja sesji: stary skrót → nowy skrót
+    now = datetime.now(timezone.utc)
+    session = await sessions_collection.find_one_and_update(
+        {"token_hash": hash_token(body.refresh_token), "user_id": user_id, "expires_at": {"$gt": now}},
+        {"$set": {
+            "token_hash": hash_token(new_refresh),
+            "expires_at": now + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES),
+            "rotated_at": now
+        }},
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if session is None:
+        # Token sprzed kolekcji sessions - atomowo zdejmujemy go z tablicy (jednorazowo) i zakładamy sesję
+        legacy = await users_collection.update_one(
+            {"_id": user_oid, "refresh_tokens": body.refresh_token},
+            {"$pull": {"refresh_tokens": body.refresh_token}}
+        )
+        if legacy.modified_count == 0:
+            raise HTTPException(status_code=401, detail="Nieprawidłowy token odświeżania")
+        await sessions_collection.insert_one({
+            "token_hash": hash_token(new_refresh),
+            "user_id": user_id,
+            "created_at": now,
+            "expires_at": now + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES),
+            "rotated_at": now
+        })
 
-    await log_action(str(user["_id"]), "refresh_token", "Odświeżono token")
+    await log_action(user_id, "refresh_token", "Odświeżono token")
 
     return {"access_token": new_access, "refresh_token": new_refresh, "token_type": "bearer"}
 
@@ -134,12 +167,19 @@ async def logout(body: TokenRefreshRequest, current_user: dict = Depends(get_cur
     """
     Wylogowanie z sesji
     """
-    result = await users_collection.update_one(
-        {"_id": current_user["_id"]},
-        {"$pull": {"refresh_tokens": body.refresh_token}}
+    result = await sessions_collection.delete_one(
+        {"token_hash": hash_token(body.refresh_token), "user_id": str(current_user["_id"])}
     )
 
-    if result.modified_count == 0:
+    removed = result.deleted_count > 0
+    if not removed:
+        # Token sprzed kolekcji sessions (tablica users.refresh_tokens)
+        legacy = await users_collection.update_one(
+            {"_id": current_user["_id"], "refresh_tokens": body.refresh_token},
+            {"$pull": {"refresh_tokens": body.refresh_token}}
+        )
+        removed = legacy.modified_count > 0
+    if not removed:
         # nie znaleziono tokenu
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List
+
+from schemas import BatchBidRequest, BatchBidResult
+from dependencies import get_current_active_user
+from utils import log_action
+from bid_engine import apply_bid_batch
+from ratelimit import rate_limit
+from config import BID_BATCH_MAX_SIZE
+
+router = APIRouter(
+    prefix="/bids",
+    tags=["bids"]
+)
+
+
+@router.post("/batch", response_model=List[BatchBidResult], dependencies=[Depends(rate_limit("bid_batch"))])
+async def place_bid_batch(batch: BatchBidRequest, current_user: dict = Depends(get_current_active_user)):
+    """
+    Wiele ofert w jednym żądaniu (dla klientów automatycznych).
+    Oferty są grupowane per aukcja i w grupie przyjmowane rosnąco - jak seria pojedynczych
+    POST /auctions/{id}/bid, ale jedną aktualizacją aukcji i jednym insert_many na grupę.
+    Wynik per oferta (w kolejności żądania): accepted + bid_id albo powód odrzucenia w detail.
+    """
+    if len(batch.bids) > BID_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"Maksymalnie {BID_BATCH_MAX_SIZE} ofert w jednym żądaniu")
+
+    user_id = str(current_user["_id"])
+    results = await apply_bid_batch(user_id, [bid.model_dump() for bid in batch.bids])
+
+    accepted = sum(1 for result in results if result["accepted"])
+    await log_action(user_id, "bid_batch", f"Paczka ofert: przyjęte {accepted} z {len(results)}")
+    return results
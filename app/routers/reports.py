@@ -1,48 +1,89 @@
-from fastapi import APIRouter, Depends
-from database import history_collection, auctions_collection
-from schemas import AuctionHistoryOut
-from typing import List
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request
+# Raporty czytają z replik (secondaryPreferred z limitem opóźnienia) - odciążenie primary
+from database import history_read_collection, auctions_read_collection, report_winners_read_collection, report_totals_read_collection
+from database import report_timeseries_read_collection
+from schemas import AuctionHistoryOut, ArchivedBidOut, BidActivityOut, TimeseriesPointOut
+from typing import List, Literal, Optional
 from dependencies import get_current_admin
 from datetime import datetime, timedelta, timezone
+from streaming import stream_cursor
+from serialization import ORJSONResponse
+from summaries import TOTALS_ID, GRANULARITIES, bucket_start
+from archive import read_bid_history, bid_activity
+from change_feed import auction_changes
+from http_cache import CachedRoute, INSTANCE, conditional
+from consistency import open_read_session
+from config import REPORT_CACHE_MAX_AGE, REPORT_TIMESERIES_MAX_BUCKETS
+
+
+async def report_cache(request: Request, admin: dict = Depends(get_current_admin)):
+    """
+    Warunkowe GET dla raportów (po sprawdzeniu uprawnień). Raporty zmieniają się przy zamknięciach
+    aukcji, więc ETag = licznik zmian aukcji + okno REPORT_CACHE_MAX_AGE sekund (ogranicza
+    nieaktualność również bez change streamu). Dane tylko dla administratora - Cache-Control private
+    (cache przeglądarki, nie współdzielone proxy).
+    Zwraca sesję odczytu przesuniętą do ostatniej zmiany z change streamu (albo None), żeby
+    treść z repliki nie była starsza niż wersja w ETag; endpointy pobierają ją przez
+    Depends(report_cache) (ten sam wynik co zależność routera), zamyka ją CachedRoute po wysłaniu odpowiedzi.
+    """
+    if REPORT_CACHE_MAX_AGE > 0:
+        window = int(time.time() // REPORT_CACHE_MAX_AGE)
+        conditional(
+            request, f'"r-{INSTANCE}-{auction_changes.version}-{window}"',
+            cache_control=f"private, max-age={REPORT_CACHE_MAX_AGE}",
+            vary="Authorization"
+        )
+    session = await open_read_session(None, after=auction_changes.last_time if auction_changes.running else None)
+    request.state.response_session = session
+    return session
+
 
 router = APIRouter(
     prefix="/reports",
-    tags=["reports"]
+    tags=["reports"],
+    route_class=CachedRoute,
+    dependencies=[Depends(report_cache)]
 )
 
+# json - pełna lista (jak dotychczas), ndjson/csv - strumień prosto z kursora
+ExportFormat = Literal["json", "ndjson", "csv"]
+
+HISTORY_FIELDS = ["id", "title", "description", "owner_id", "created_at", "closed_at", "winner_id", "final_price"]
+
+
+def history_doc_out(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "title": doc["title"],
+        "description": doc.get("description"),
+        "owner_id": doc["owner_id"],
+        "created_at": doc["created_at"],
+        "closed_at": doc["closed_at"],
+        "winner_id": doc.get("winner_id"),
+        "final_price": doc.get("final_price")
+    }
+
 @router.get("/history", response_model=List[AuctionHistoryOut])
-async def auctions_history(admin: dict = Depends(get_current_admin)):
+async def auctions_history(format: ExportFormat = "json", admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie historii wszystkich aukcji (dla administratora).
+    format=ndjson|csv zwraca strumień (eksport dowolnie dużej historii).
     """
-    cursor = history_collection.find()
-    history_list = []
-    async for doc in cursor:
-        history_list.append(AuctionHistoryOut(
-            id=str(doc["_id"]),
-            title=doc["title"],
-            description=doc.get("description"),
-            owner_id=doc["owner_id"],
-            created_at=doc["created_at"],
-            closed_at=doc["closed_at"],
-            winner_id=doc.get("winner_id"),
-            final_price=doc.get("final_price")
-        ))
-    return history_list
+    cursor = history_read_collection.find(session=session)
+    if format != "json":
+        return stream_cursor(cursor, format, HISTORY_FIELDS, "auctions-history", history_doc_out)
+    return ORJSONResponse([history_doc_out(doc) async for doc in cursor])
 
 @router.get("/user-spending")
-async def get_user_spending(admin: dict = Depends(get_current_admin)):
+async def get_user_spending(admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie sumy wydatków każdego użytkownika, który wygrał przynajmniej jedną aukcję.
+    Czyta zmaterializowane podsumowania (report.winners), nie całą historię.
     Widoczne tylko dla administratora.
     """
     pipeline = [
-        {"$match": {"winner_id": {"$ne": None}}},
-        {"$group": {
-            "_id": "$winner_id",
-            "total_spent": {"$sum": "$final_price"},
-            "won_count": {"$sum": 1}
-        }},
+        {"$sort": {"total_spent": -1}},
         {"$addFields": {"user_obj_id": {"$toObjectId": "$_id"}}},
         {"$lookup": {
             "from": "users",
@@ -57,25 +98,20 @@ async def get_user_spending(admin: dict = Depends(get_current_admin)):
             "email": "$user.email",
             "total_spent": 1,
             "won_count": 1
-        }},
-        {"$sort": {"total_spent": -1}}
+        }}
     ]
-    results = await history_collection.aggregate(pipeline).to_list(length=None)
+    results = await report_winners_read_collection.aggregate(pipeline, session=session).to_list(length=None)
     return results
 
 @router.get("/top-winners")
-async def top_winners(limit: int = 10, admin: dict = Depends(get_current_admin)):
+async def top_winners(limit: int = 10, admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie listy użytkowników z największą liczbą wygranych aukcji (domyślnie top 10).
+    Czyta zmaterializowane podsumowania (report.winners).
     Widoczne tylko dla administratora.
     """
     pipeline = [
-        {"$match": {"winner_id": {"$ne": None}}},
-        {"$group": {
-            "_id": "$winner_id",
-            "won_count": {"$sum": 1},
-            "total_spent": {"$sum": "$final_price"}
-        }},
+        {"$sort": {"won_count": -1}},
         {"$addFields": {"user_obj_id": {"$toObjectId": "$_id"}}},
         {"$lookup": {
             "from": "users",
@@ -84,145 +120,96 @@ async def top_winners(limit: int = 10, admin: dict = Depends(get_current_admin))
             "as": "user"
         }},
         {"$unwind": "$user"},
+        # Limit po złączeniu - zwycięzcy z usuniętym kontem nie zmniejszają liczby wierszy
+        {"$limit": limit},
         {"$project": {
             "user_id": "$_id",
             "username": "$user.username",
             "won_count": 1,
             "total_spent": 1
-        }},
-        {"$sort": {"won_count": -1}},
-        {"$limit": limit}
+        }}
     ]
-    results = await history_collection.aggregate(pipeline).to_list(length=None)
+    results = await report_winners_read_collection.aggregate(pipeline, session=session).to_list(length=None)
     return results
 
 @router.get("/total-cashflow")
-async def total_cashflow(admin: dict = Depends(get_current_admin)):
+async def total_cashflow(admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie całkowitej wartości pieniężnej wygenerowanej przez zakończone aukcje.
     Dostępne tylko dla administratora.
     """
-    result = await history_collection.aggregate([
-        {"$match": {"winner_id": {"$ne": None}}},
-        {"$group": {"_id": None, "total": {"$sum": "$final_price"}}}
-    ]).to_list(length=1)
-    return {"total_cashflow": result[0]["total"] if result else 0}
+    totals = await report_totals_read_collection.find_one({"_id": TOTALS_ID}, session=session)
+    return {"total_cashflow": totals["cashflow"] if totals else 0}
+
+# Wiersz eksportu historii - daty jako tekst ISO (jak w pierwotnych raportach)
+HISTORY_EXPORT_PROJECTION = {
+    "id": {"$toString": "$_id"},
+    "title": 1,
+    "description": 1,
+    "owner_id": 1,
+    "created_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$created_at"}},
+    "closed_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$closed_at"}},
+    "winner_id": 1,
+    "final_price": 1,
+    "_id": 0
+}
+
+
+async def _history_export(match: dict, format: ExportFormat, filename: str, session=None):
+    pipeline = [{"$match": match}, {"$project": HISTORY_EXPORT_PROJECTION}]
+    if format != "json":
+        return stream_cursor(history_read_collection.aggregate(pipeline, session=session), format, HISTORY_FIELDS, filename)
+    return await history_read_collection.aggregate(pipeline, session=session).to_list(length=None)
+
+
+async def _recent_history(window: timedelta, format: ExportFormat, filename: str, session=None):
+    """Zakończone aukcje utworzone w ostatnim oknie czasu (wspólna część raportów last-*)."""
+    since = datetime.now(timezone.utc) - window
+    return await _history_export({"created_at": {"$gte": since}}, format, filename, session)
 
 @router.get("/high-value-auctions")
-async def high_value_auctions(min_price: float = 1000.0, admin: dict = Depends(get_current_admin)):
+async def high_value_auctions(min_price: float = 1000.0, format: ExportFormat = "json", admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie aukcji, których cena końcowa przekroczyła określoną wartość minimalną (domyślnie 1000).
     Widoczne tylko dla administratora.
     """
-    pipeline = [
-        {"$match": {"final_price": {"$gte": min_price}}},
-        {"$project": {
-            "id": {"$toString": "$_id"},
-            "title": 1,
-            "description": 1,
-            "owner_id": 1,
-            "created_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$created_at"}},
-            "closed_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$closed_at"}},
-            "winner_id": 1,
-            "final_price": 1,
-            "_id": 0
-        }}
-    ]
-    results = await history_collection.aggregate(pipeline).to_list(length=None)
-    return results
+    return await _history_export({"final_price": {"$gte": min_price}}, format, "high-value-auctions", session)
 
 @router.get("/last-week-auctions")
-async def last_week_auctions(admin: dict = Depends(get_current_admin)):
+async def last_week_auctions(format: ExportFormat = "json", admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie aukcji utworzonych w ciągu ostatnich 7 dni.
     Widoczne tylko dla administratora.
     """
-    since = datetime.now(timezone.utc) - timedelta(days=7)
-    pipeline = [
-        {"$match": {"created_at": {"$gte": since}}},
-        {"$project": {
-            "id": {"$toString": "$_id"},
-            "title": 1,
-            "description": 1,
-            "owner_id": 1,
-            "created_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$created_at"}},
-            "closed_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$closed_at"}},
-            "winner_id": 1,
-            "final_price": 1,
-            "_id": 0
-        }}
-    ]
-    results = await history_collection.aggregate(pipeline).to_list(length=None)
-    return results
+    return await _recent_history(timedelta(days=7), format, "last-week-auctions", session)
 
 @router.get("/last-month-auctions")
-async def last_month_auctions(admin: dict = Depends(get_current_admin)):
+async def last_month_auctions(format: ExportFormat = "json", admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie aukcji utworzonych w ciągu ostatnich 30 dni.
     Widoczne tylko dla administratora.
     """
-    since = datetime.now(timezone.utc) - timedelta(days=30)
-    pipeline = [
-        {"$match": {"created_at": {"$gte": since}}},
-        {"$project": {
-            "id": {"$toString": "$_id"},
-            "title": 1,
-            "description": 1,
-            "owner_id": 1,
-            "created_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$created_at"}},
-            "closed_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$closed_at"}},
-            "winner_id": 1,
-            "final_price": 1,
-            "_id": 0
-        }}
-    ]
-    results = await history_collection.aggregate(pipeline).to_list(length=None)
-    return results
+    return await _recent_history(timedelta(days=30), format, "last-month-auctions", session)
 
 @router.get("/last-6h-auctions")
-async def last_6h_auctions(admin: dict = Depends(get_current_admin)):
+async def last_6h_auctions(format: ExportFormat = "json", admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie aukcji utworzonych w ciągu ostatnich 6 godzin.
     Widoczne tylko dla administratora.
     """
-    since = datetime.now(timezone.utc) - timedelta(hours=6)
-    pipeline = [
-        {"$match": {"created_at": {"$gte": since}}},
-        {"$project": {
-            "id": {"$toString": "$_id"},
-            "title": 1,
-            "description": 1,
-            "owner_id": 1,
-            "created_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$created_at"}},
-            "closed_at": {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S%z", "date": "$closed_at"}},
-            "winner_id": 1,
-            "final_price": 1,
-            "_id": 0
-        }}
-    ]
-    results = await history_collection.aggregate(pipeline).to_list(length=None)
-    return results
+    return await _recent_history(timedelta(hours=6), format, "last-6h-auctions", session)
 
 @router.get("/auctions-stats")
 
-async def auctions_stats(admin: dict = Depends(get_current_admin)):
+async def auctions_stats(admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
     """
     Pobranie statystyk aukcji: liczba aktywnych i zamkniętych aukcji.
     Widoczne tylko dla administratora.
     """
-    auctions_active_count = await auctions_collection.count_documents({})
-
-    pipeline = [
-        {
-            "$group": {
-                "_id": "closed",
-                "count": {"$sum": 1}
-            }
-        }
-    ]
-    result = await history_collection.aggregate(pipeline).to_list(length=None)
+    auctions_active_count = await auctions_read_collection.count_documents({}, session=session)
 
-    auctions_closed_count = result[0]["count"] if result else 0
+    totals = await report_totals_read_collection.find_one({"_id": TOTALS_ID}, session=session)
+    auctions_closed_count = totals["closed_count"] if totals else 0
 
     stats = {
         "auctions_active": auctions_active_count,
@@ -230,3 +217,66 @@ async def auctions_stats(admin: dict = Depends(get_current_admin)):
     }
 
     return stats
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """Daty w archiwum ofert są zapisane jako UTC bez strefy."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@router.get("/bid-history/{auction_id}", response_model=List[ArchivedBidOut])
+async def archived_bid_history(auction_id: str, admin: dict = Depends(get_current_admin), session=Depends(report_cache)):
+    """
+    Pełna historia ofert zakończonej aukcji (z archiwum kubełkowego), w kolejności czasu.
+    Widoczne tylko dla administratora.
+    """
+    return [bid async for bid in read_bid_history(auction_id, session)]
+
+@router.get("/bid-activity", response_model=List[BidActivityOut])
+async def archived_bid_activity(
+    start: datetime,
+    end: Optional[datetime] = None,
+    admin: dict = Depends(get_current_admin),
+    session=Depends(report_cache)
+):
+    """
+    Aktywność licytacji zakończonych aukcji w oknie czasu [start, end) - per aukcja
+    liczba ofert, najwyższa kwota, pierwsza i ostatnia oferta.
+    Widoczne tylko dla administratora.
+    """
+    end = end or datetime.now(timezone.utc)
+    return await bid_activity(_utc_naive(start), _utc_naive(end), session)
+
+@router.get("/timeseries", response_model=List[TimeseriesPointOut])
+async def closed_auctions_timeseries(
+    start: datetime,
+    end: Optional[datetime] = None,
+    granularity: Literal["minute", "hour", "day"] = "hour",
+    admin: dict = Depends(get_current_admin),
+    session=Depends(report_cache)
+):
+    """
+    Zamknięte aukcje w oknie [start, end) w kubełkach minute/hour/day (po dacie zamknięcia):
+    liczba zamkniętych i sprzedanych, suma i maksimum cen końcowych.
+    Czyta gotowe kubełki z report.timeseries (bez skanowania historii); puste kubełki są pomijane.
+    Widoczne tylko dla administratora.
+    """
+    end = _utc_naive(end or datetime.now(timezone.utc))
+    start = bucket_start(_utc_naive(start), granularity)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Początek okna musi być przed jego końcem")
+    if (end - start) / GRANULARITIES[granularity] > REPORT_TIMESERIES_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Zbyt wiele kubełków (maksymalnie {REPORT_TIMESERIES_MAX_BUCKETS}) - wybierz większą ziarnistość"
+        )
+    cursor = report_timeseries_read_collection.find(
+        {"granularity": granularity, "bucket": {"$gte": start, "$lt": end}},
+        projection={"_id": 0, "granularity": 0},
+        session=session
+    ).sort("bucket", 1)
+    return ORJSONResponse([
+        {"bucket": doc["bucket"], "count": doc["count"], "sold": doc["sold"], "sum": doc["sum"], "max": doc.get("max")}
+        async for doc in cursor
+    ])
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from schemas import UserOut, BidOut
-from dependencies import get_current_active_user, get_current_admin
-from database import users_collection, bids_collection
+from dependencies import get_current_active_user, get_current_admin, invalidate_principal
+from utils import log_action
+from database import users_collection, sessions_collection, users_read_collection, bids_read_collection
+from consistency import read_session
+from serialization import ORJSONResponse, doc_out, BID_FIELDS, USER_FIELDS
 from bson import ObjectId
 
 router = APIRouter(
@@ -16,16 +19,12 @@ async def list_users(admin_user: dict = Depends(get_current_admin)):
     """
     Lista wszystkich użytkowników - dostępne tylko dla administratora.
     """
-    users_cursor = users_collection.find()
     users = []
-    async for u in users_cursor:
-        users.append(UserOut(
-            id=str(u["_id"]),
-            username=u["username"],
-            email=u["email"],
-            role=u.get("role", "user")
-        ))
-    return users
+    async for u in users_read_collection.find(projection={"username": 1, "email": 1, "role": 1}):
+        out = doc_out(u, USER_FIELDS)
+        out["role"] = u.get("role", "user")
+        users.append(out)
+    return ORJSONResponse(users)
 
 
 @router.get("/{user_id}", response_model=UserOut)
@@ -60,14 +59,35 @@ async def get_user_bids(user_id: str, current_user: dict = Depends(get_current_a
     """
     if current_user.get("role") != "admin" and str(current_user["_id"]) != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Brak uprawnień")
-    bids_cursor = bids_collection.find({"user_id": user_id})
     bids = []
-    async for b in bids_cursor:
-        bids.append(BidOut(
-            id=str(b["_id"]),
-            auction_id=b["auction_id"],
-            user_id=b["user_id"],
-            amount=b["amount"],
-            timestamp=b["timestamp"]
-        ))
-    return bids
+    # Odczyt z repliki w sesji przyczynowej - właśnie złożona oferta jest już widoczna
+    async with read_session(str(current_user["_id"])) as session:
+        async for b in bids_read_collection.find({"user_id": user_id}, session=session):
+            bids.append(doc_out(b, BID_FIELDS))
+    return ORJSONResponse(bids)
+
+
+@router.post("/{user_id}/revoke-tokens")
+async def revoke_user_tokens(user_id: str, current_user: dict = Depends(get_current_active_user)):
+    """
+    Unieważnienie wszystkich wydanych tokenów użytkownika (podbicie token_version).
+    Tylko właściciel konta lub administrator.
+    Inne workery zobaczą zmianę najpóźniej po PRINCIPAL_CACHE_TTL_SECONDS (nie dotyczy AUTH_MODE=stateless).
+    """
+    if current_user.get("role") != "admin" and str(current_user["_id"]) != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Brak uprawnień")
+    try:
+        result = await users_collection.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$inc": {"token_version": 1}}
+        )
+    except:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy identyfikator użytkownika")
+
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Użytkownik nie znaleziony")
+
+    await sessions_collection.delete_many({"user_id": user_id})
+    invalidate_principal(user_id)
+    await log_action(str(current_user["_id"]), "revoke_tokens", f"Unieważniono tokeny użytkownika {user_id}")
+    return {"message": "Tokeny użytkownika zostały unieważnione"}
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from config import SCHEDULER_POLL_SECONDS, SCHEDULER_BATCH_SIZE, SCHEDULER_LEASE_SECONDS
+from database import auctions_collection, leases_collection
+from closing import finalize_auction
+
+logger = logging.getLogger("auction_app")
+
+
+class ExpiryScheduler:
+    """
+    Zamykanie aukcji po upływie ends_at.
+    - działa tylko w workerze, który trzyma dzierżawę (lease) w kolekcji scheduler.leases,
+    - jedno zapytanie po indeksie ends_at pobiera paczkę (SCHEDULER_BATCH_SIZE) zaległych aukcji,
+      które zamykamy równolegle tą samą logiką co POST /auctions/{id}/close,
+    - pełna paczka → od razu następna; inaczej śpimy do najbliższego ends_at (max SCHEDULER_POLL_SECONDS),
+    - aukcja, której zamknięcie się nie powiodło, jest odkładana z wykładniczym opóźnieniem
+      (bez tego zaległe ends_at dawałoby pętlę bez snu i zalew błędów).
+    """
+
+    LEASE_ID = "auction-expiry"
+    MIN_SLEEP_SECONDS = 0.1     # minimalna przerwa między przebiegami
+    MAX_RETRY_SECONDS = 300.0   # górna granica odłożenia nieudanego zamknięcia
+
+    def __init__(self, poll_seconds: float, batch_size: int, lease_seconds: float):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.closed = 0
+        self._deferred = {}  # auction_id (ObjectId) -> (retry_at monotonic, liczba niepowodzeń)
+
+    def _defer(self, auction_id, error: Exception):
+        _, failures = self._deferred.get(auction_id, (0.0, 0))
+        failures += 1
+        delay = min(self.MAX_RETRY_SECONDS, self.poll_seconds * 2 ** (failures - 1))
+        self._deferred[auction_id] = (time.monotonic() + delay, failures)
+        logger.error("Nie udało się zamknąć aukcji %s (próba %d, ponowienie za %.0f s): %s", auction_id, failures, delay, error)
+
+    def _deferred_ids(self) -> list:
+        """Aukcje, których ponowienie jeszcze nie nadeszło (reszta wraca do kolejki)."""
+        now = time.monotonic()
+        return [auction_id for auction_id, (retry_at, _) in self._deferred.items() if retry_at > now]
+
+    async def acquire_lease(self) -> bool:
+        """Przejęcie lub przedłużenie dzierżawy. False, jeśli ważną dzierżawę ma inny worker."""
+        now = datetime.now()
+        try:
+            await leases_collection.find_one_and_update(
+                {"_id": self.LEASE_ID, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Dokument istnieje, ale nie pasuje do filtra - dzierżawa jest czyjaś
+            return False
+        return True
+
+    async def close_due(self) -> int:
+        """Zamyka jedną paczkę aukcji z ends_at <= teraz. Zwraca liczbę obsłużonych aukcji."""
+        due = await auctions_collection.find(
+            {"ends_at": {"$lte": datetime.now()}, "_id": {"$nin": self._deferred_ids()}},
+            projection={"_id": 1}
+        ).sort("ends_at", 1).limit(self.batch_size).to_list(length=self.batch_size)
+
+        # Odłożone aukcje, które po terminie ponowienia nie są już zaległe (np. zamknięte gdzie indziej)
+        due_ids = {auc["_id"] for auc in due}
+        now = time.monotonic()
+        for auction_id in [i for i, (retry_at, _) in self._deferred.items() if retry_at <= now and i not in due_ids]:
+            del self._deferred[auction_id]
+
+        results = await asyncio.gather(
+            *(finalize_auction(str(auc["_id"])) for auc in due),
+            return_exceptions=True
+        )
+        handled = 0
+        for auc, result in zip(due, results):
+            if isinstance(result, HTTPException) and result.status_code == 404:
+                self._deferred.pop(auc["_id"], None)
+                handled += 1  # zamknięta w międzyczasie ręcznie
+            elif isinstance(result, Exception):
+                self._defer(auc["_id"], result)
+            else:
+                self._deferred.pop(auc["_id"], None)
+                handled += 1
+                self.closed += 1
+        return handled
+
+    async def seconds_to_next(self) -> float:
+        deferred = self._deferred_ids()
+        nxt = await auctions_collection.find_one(
+            {"ends_at": {"$gt": datetime.min}, "_id": {"$nin": deferred}},
+            projection={"ends_at": 1},
+            sort=[("ends_at", 1)]
+        )
+        wait = self.poll_seconds
+        if nxt is not None:
+            wait = (nxt["ends_at"] - datetime.now()).total_seconds()
+        if deferred:
+            wait = min(wait, min(self._deferred[i][0] for i in deferred) - time.monotonic())
+        return min(self.poll_seconds, max(self.MIN_SLEEP_SECONDS, wait))
+
+    async def run(self):
+        while True:
+            try:
+                if not await self.acquire_lease():
+                    await asyncio.sleep(self.lease_seconds / 2)
+                    continue
+                if await self.close_due() >= self.batch_size:
+                    continue
+                await asyncio.sleep(await self.seconds_to_next())
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning("Harmonogram zamykania aukcji: %s", e)
+                await asyncio.sleep(self.poll_seconds)
+
+
+expiry_scheduler = ExpiryScheduler(SCHEDULER_POLL_SECONDS, SCHEDULER_BATCH_SIZE, SCHEDULER_LEASE_SECONDS)
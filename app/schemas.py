@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -41,6 +41,7 @@ class AuctionCreate(BaseModel):
     title: str = Field(..., example="Laptop Lenovo")
     description: Optional[str] = Field(None, example="Używany, stan bardzo dobry")
     starting_price: float = Field(..., gt=0, example=100.0)
+    duration_minutes: Optional[int] = Field(None, gt=0, example=60)  # brak = aukcja bez terminu
 
 
 class AuctionOut(BaseModel):
@@ -50,6 +51,29 @@ class AuctionOut(BaseModel):
     owner_id: str
     current_price: float
     created_at: datetime
+    ends_at: Optional[datetime] = None
+
+
+class AuctionSearchHit(AuctionOut):
+    score: Optional[float] = None  # trafność (tylko przy wyszukiwaniu z q)
+
+
+class FacetBucket(BaseModel):
+    label: str
+    count: int
+
+
+class AuctionSearchOut(BaseModel):
+    items: List[AuctionSearchHit]
+    total: int
+    page: int
+    page_size: int
+    facets: Dict[str, List[FacetBucket]]  # "price", "recency"
+
+
+class AutocompleteOut(BaseModel):
+    id: str
+    title: str
 
 
 class AuctionHistoryOut(BaseModel):
@@ -75,3 +99,55 @@ class BidOut(BaseModel):
     user_id: str
     amount: float
     timestamp: datetime
+
+
+class ProxyBidCreate(BaseModel):
+    max_amount: float = Field(..., gt=0, example=500.0)
+
+
+class ProxyBidOut(BaseModel):
+    auction_id: str
+    max_amount: float
+    current_price: float
+    leading: bool  # czy użytkownik prowadzi po rozstrzygnięciu
+
+
+class BatchBidItem(BaseModel):
+    auction_id: str
+    amount: float = Field(..., gt=0, example=150.0)
+
+
+class BatchBidRequest(BaseModel):
+    bids: List[BatchBidItem] = Field(..., min_length=1)
+
+
+class BatchBidResult(BaseModel):
+    index: int                    # pozycja oferty w żądaniu
+    auction_id: str
+    amount: float
+    accepted: bool
+    bid_id: Optional[str] = None
+    detail: Optional[str] = None  # powód odrzucenia
+
+
+class ArchivedBidOut(BaseModel):
+    auction_id: str
+    user_id: str
+    amount: float
+    timestamp: datetime
+
+
+class BidActivityOut(BaseModel):
+    auction_id: str
+    bids: int
+    max_amount: float
+    first_bid: datetime
+    last_bid: datetime
+
+
+class TimeseriesPointOut(BaseModel):
+    bucket: datetime           # początek kubełka
+    count: int                 # zamknięte aukcje
+    sold: int                  # w tym sprzedane (ze zwycięzcą)
+    sum: float                 # suma cen końcowych sprzedanych
+    max: Optional[float] = None  # najwyższa cena końcowa (None - brak sprzedaży)
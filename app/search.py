@@ -0,0 +1,230 @@
+"""
+Wyszukiwanie aktywnych aukcji.
+- search_auctions: indeks tekstowy (title ×10, description ×2) + filtry, jedno zapytanie $facet
+  zwraca stronę wyników, łączną liczbę oraz fasety ceny i daty dodania,
+- AutocompleteIndex: odwrócony indeks słów z tytułów w pamięci procesu (podpowiedzi po prefiksie),
+  aktualizowany z change streamu aukcji; bez change streamu przebudowywany co
+  SEARCH_AUTOCOMPLETE_REBUILD_SECONDS.
+"""
+import asyncio
+import bisect
+import logging
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from pymongo.errors import PyMongoError
+
+from config import SEARCH_PRICE_BUCKETS, SEARCH_AUTOCOMPLETE_REBUILD_SECONDS
+from database import auctions_collection, auctions_read_collection
+from change_feed import auction_changes
+
+logger = logging.getLogger("auction_app")
+
+SEARCH_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "owner_id": 1,
+    "current_price": 1,
+    "created_at": 1,
+    "ends_at": 1,
+    "score": 1
+}
+
+# Fasety daty dodania: (etykieta, wiek w dniach) - od najstarszych
+RECENCY_BUCKETS = [("30d", 30), ("7d", 7), ("24h", 1)]
+
+
+def _price_label(lower) -> str:
+    if lower == "other":
+        return f"{SEARCH_PRICE_BUCKETS[-1]:g}+"
+    upper = SEARCH_PRICE_BUCKETS[SEARCH_PRICE_BUCKETS.index(lower) + 1]
+    return f"{lower:g}-{upper:g}"
+
+
+async def search_auctions(q, conditions: list, page: int, page_size: int) -> dict:
+    """
+    Strona wyników wyszukiwania (q może być puste - wtedy same filtry, od najnowszych).
+    conditions: dodatkowe warunki $match (cena, właściciel, ...).
+    Zwraca {"items", "total", "page", "page_size", "facets": {"price", "recency"}}.
+    """
+    now = datetime.now()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)  # BSON przechowuje milisekundy
+    match = {"$and": conditions} if conditions else {}
+    if q:
+        match = {"$text": {"$search": q}, **match}
+        sort = {"score": -1, "_id": -1}
+    else:
+        sort = {"created_at": -1, "_id": -1}
+
+    # Granice faset: cena ostatniego przedziału i starsze niż 30 dni trafiają do "default"
+    recency_bounds = [now - timedelta(days=days) for _, days in RECENCY_BUCKETS] + [now + timedelta(days=1)]
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {"score": {"$meta": "textScore"}}} if q else {"$addFields": {"score": None}},
+        {"$facet": {
+            "items": [{"$sort": sort}, {"$skip": (page - 1) * page_size}, {"$limit": page_size}, {"$project": SEARCH_PROJECTION}],
+            "total": [{"$count": "count"}],
+            "price": [{"$bucket": {
+                "groupBy": "$current_price", "boundaries": SEARCH_PRICE_BUCKETS, "default": "other",
+                "output": {"count": {"$sum": 1}}
+            }}],
+            "recency": [{"$bucket": {
+                "groupBy": "$created_at", "boundaries": recency_bounds, "default": "older",
+                "output": {"count": {"$sum": 1}}
+            }}]
+        }}
+    ]
+    result = (await auctions_read_collection.aggregate(pipeline).to_list(length=1))[0]
+
+    recency_labels = {bound: label for bound, (label, _) in zip(recency_bounds, RECENCY_BUCKETS)}
+    return {
+        "items": result["items"],
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "page": page,
+        "page_size": page_size,
+        "facets": {
+            "price": [{"label": _price_label(b["_id"]), "count": b["count"]} for b in result["price"]],
+            "recency": [
+                {"label": recency_labels.get(b["_id"], "older"), "count": b["count"]} for b in result["recency"]
+            ]
+        }
+    }
+
+
+def normalize(text: str) -> str:
+    """Małe litery bez polskich znaków diakrytycznych (ą → a, ł → l, ...)."""
+    text = unicodedata.normalize("NFKD", text.lower().replace("ł", "l"))
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> set:
+    return set(re.findall(r"\w+", normalize(text or "")))
+
+
+class AutocompleteIndex:
+    """
+    Słowo → identyfikatory aukcji, plus posortowana lista słów do wyszukiwania po prefiksie (bisect).
+    Zapytanie "rower gór": wszystkie słowa poza ostatnim muszą wystąpić w całości, ostatnie - jako prefiks.
+    """
+
+    MAX_PREFIX_TOKENS = 1000  # ile słów pasujących do prefiksu bierzemy pod uwagę
+
+    def __init__(self):
+        self._titles = {}   # auction_id -> tytuł
+        self._tokens = {}   # słowo -> set(auction_id)
+        self._sorted = []   # posortowane słowa
+        self.ready = False
+        self.rebuilds = 0
+        self._rebuild_task = None
+        self._pending = None  # zmiany z change streamu w trakcie przebudowy (do powtórzenia)
+
+    def add(self, auction_id: str, title: str):
+        self.remove(auction_id)
+        self._titles[auction_id] = title
+        for token in tokenize(title):
+            ids = self._tokens.get(token)
+            if ids is None:
+                ids = self._tokens[token] = set()
+                bisect.insort(self._sorted, token)
+            ids.add(auction_id)
+
+    def remove(self, auction_id: str):
+        title = self._titles.pop(auction_id, None)
+        if title is None:
+            return
+        for token in tokenize(title):
+            ids = self._tokens.get(token)
+            if ids is None:
+                continue
+            ids.discard(auction_id)
+            if not ids:
+                del self._tokens[token]
+                del self._sorted[bisect.bisect_left(self._sorted, token)]
+
+    def _prefix_ids(self, prefix: str) -> set:
+        ids = set()
+        start = bisect.bisect_left(self._sorted, prefix)
+        for token in self._sorted[start:start + self.MAX_PREFIX_TOKENS]:
+            if not token.startswith(prefix):
+                break
+            ids |= self._tokens[token]
+        return ids
+
+    def suggest(self, q: str, limit: int) -> list:
+        words = re.findall(r"\w+", normalize(q))
+        if not words:
+            return []
+        ids = self._prefix_ids(words[-1])
+        for word in words[:-1]:
+            ids &= self._tokens.get(word, set())
+        titles = sorted((self._titles[i], i) for i in ids)
+        return [{"id": auction_id, "title": title} for title, auction_id in titles[:limit]]
+
+    async def rebuild(self):
+        """
+        Pełne przeładowanie tytułów aktywnych aukcji. Zmiany, które przyszły w trakcie
+        skanowania, są powtarzane na nowym indeksie (add/remove są idempotentne).
+        """
+        self._pending = []
+        try:
+            titles, tokens = {}, {}
+            # Primary - skan nie może być starszy niż zdarzenia change streamu
+            async for doc in auctions_collection.find({}, projection={"title": 1}):
+                auction_id = str(doc["_id"])
+                titles[auction_id] = doc.get("title") or ""
+                for token in tokenize(titles[auction_id]):
+                    tokens.setdefault(token, set()).add(auction_id)
+            self._titles, self._tokens, self._sorted = titles, tokens, sorted(tokens)
+            for change in self._pending:
+                self._apply_change(change)
+        finally:
+            self._pending = None
+        self.ready = True
+        self.rebuilds += 1
+
+    def handle_change(self, change: dict):
+        """Odbiorca change streamu aukcji."""
+        if not change.get("documentKey"):
+            self.handle_reset()
+            return
+        if self._pending is not None:
+            self._pending.append(change)
+        self._apply_change(change)
+
+    def _apply_change(self, change: dict):
+        key = change["documentKey"]
+        auction_id = str(key["_id"])
+        operation = change["operationType"]
+        if operation in ("insert", "replace"):
+            self.add(auction_id, change["fullDocument"].get("title") or "")
+        elif operation == "update":
+            title = change["updateDescription"]["updatedFields"].get("title")
+            if title is not None:
+                self.add(auction_id, title)
+        elif operation == "delete":
+            self.remove(auction_id)
+
+    async def _rebuild_logged(self):
+        try:
+            await self.rebuild()
+        except PyMongoError as e:
+            logger.warning("Indeks podpowiedzi aukcji: %s", e)
+
+    def handle_reset(self):
+        """Po (ponownym) podłączeniu change streamu - mogliśmy przegapić zmiany. Jedna przebudowa naraz."""
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self._rebuild_logged())
+        return self._rebuild_task
+
+    async def run(self):
+        """Pierwsze załadowanie; bez change streamu - okresowa przebudowa."""
+        while True:
+            if not self.ready or not auction_changes.running:
+                await self.handle_reset()
+            await asyncio.sleep(SEARCH_AUTOCOMPLETE_REBUILD_SECONDS)
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "auctions": len(self._titles), "tokens": len(self._sorted), "rebuilds": self.rebuilds}
+
+
+autocomplete = AutocompleteIndex()
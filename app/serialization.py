@@ -0,0 +1,41 @@
+"""
+Szybka ścieżka serializacji list: dokument z MongoDB → dict z polami schematu → orjson.
+Bez budowania modelu Pydantic per dokument i bez ponownej walidacji przez response_model
+(FastAPI nie przetwarza zwróconego obiektu Response). response_model zostaje tylko dla dokumentacji.
+"""
+from datetime import datetime
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+AUCTION_FIELDS = ["title", "description", "owner_id", "current_price", "created_at", "ends_at"]
+BID_FIELDS = ["auction_id", "user_id", "amount", "timestamp"]
+USER_FIELDS = ["username", "email"]
+
+
+def default(value):
+    """Typy BSON spoza JSON (orjson sam obsługuje datetime; gałąź datetime dla eksportu CSV)."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Nieobsługiwany typ: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=default)
+
+
+def doc_out(doc: dict, fields: list) -> dict:
+    """Dokument w kształcie schematu *Out: id (str) + wybrane pola (brakujące jako null)."""
+    out = {"id": str(doc["_id"])}
+    for field in fields:
+        out[field] = doc.get(field)
+    return out
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse serializowany przez orjson (ObjectId → str, datetime → ISO 8601)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,60 @@
+import csv
+import io
+from datetime import datetime
+from bson import ObjectId
+from fastapi.responses import StreamingResponse
+
+from config import EXPORT_BATCH_SIZE
+from serialization import default, dumps
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (ObjectId, datetime)):
+        return default(value)
+    return value
+
+
+async def _ndjson_lines(cursor, transform):
+    async for doc in cursor:
+        yield dumps(transform(doc)) + b"\n"
+
+
+async def _csv_lines(cursor, transform, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    async for doc in cursor:
+        writer.writerow({k: _csv_value(v) for k, v in transform(doc).items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Pusty wynik - zwracamy sam nagłówek
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_cursor(cursor, fmt: str, fields: list, filename: str, transform=lambda doc: doc) -> StreamingResponse:
+    """
+    Strumieniowa odpowiedź (NDJSON lub CSV) prosto z kursora Motor.
+    Dokumenty są pobierane paczkami po EXPORT_BATCH_SIZE, więc pamięć nie rośnie z rozmiarem wyniku.
+    - cursor: kursor find() lub aggregate(),
+    - fields: kolumny CSV (kolejność),
+    - transform: przekształcenie dokumentu przed serializacją.
+    """
+    cursor = cursor.batch_size(EXPORT_BATCH_SIZE)
+    if fmt == "csv":
+        body = _csv_lines(cursor, transform, fields)
+    else:
+        body = _ndjson_lines(cursor, transform)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
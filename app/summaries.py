@@ -0,0 +1,169 @@
+"""
+Zmaterializowane podsumowania raportów.
+- report.winners: {_id: winner_id, total_spent, won_count} - jeden dokument na zwycięzcę,
+- report.totals: {_id: "global", cashflow, closed_count},
+- report.timeseries: {granularity, bucket, count, sold, sum, max} - kubełki czasu zamknięcia
+  (closed_at, UTC) dla ziarnistości minute/hour/day; sum i max liczone z final_price sprzedanych aukcji.
+close_auction aktualizuje je przyrostowo (w tej samej transakcji co wpis do historii),
+a rebuild_summaries przelicza je od zera z auction.history (naprawa rozjazdu).
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from database import history_collection, report_winners_collection, report_totals_collection, report_timeseries_collection
+
+logger = logging.getLogger("auction_app")
+
+TOTALS_ID = "global"
+MIGRATIONS_ID = "migrations"  # znaczniki wykonanych migracji danych (w report.totals)
+
+# Ziarnistość → długość kubełka
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1)
+}
+
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    """Początek kubełka zawierającego `value` (obcięcie do minuty / godziny / dnia)."""
+    value = value.replace(second=0, microsecond=0)
+    if granularity in ("hour", "day"):
+        value = value.replace(minute=0)
+    if granularity == "day":
+        value = value.replace(hour=0)
+    return value
+
+
+async def record_closed_auction(history_doc: dict, session=None):
+    """Przyrostowa aktualizacja podsumowań po zamknięciu aukcji."""
+    winner_id = history_doc.get("winner_id")
+    final_price = history_doc.get("final_price") or 0
+
+    await report_totals_collection.update_one(
+        {"_id": TOTALS_ID},
+        {"$inc": {"closed_count": 1, "cashflow": final_price if winner_id is not None else 0}},
+        upsert=True,
+        session=session
+    )
+    if winner_id is not None:
+        await report_winners_collection.update_one(
+            {"_id": winner_id},
+            {"$inc": {"total_spent": final_price, "won_count": 1}},
+            upsert=True,
+            session=session
+        )
+
+    sold = winner_id is not None
+    for granularity in GRANULARITIES:
+        update = {"$inc": {"count": 1, "sold": 1 if sold else 0, "sum": final_price if sold else 0}}
+        if sold:
+            update["$max"] = {"max": final_price}
+        await report_timeseries_collection.update_one(
+            {"granularity": granularity, "bucket": bucket_start(history_doc["closed_at"], granularity)},
+            update,
+            upsert=True,
+            session=session
+        )
+
+
+async def rebuild_timeseries() -> int:
+    """Przeliczenie kubełków czasu od zera z auction.history. Zwraca liczbę kubełków."""
+    sold = {"$ne": [{"$ifNull": ["$winner_id", None]}, None]}
+    await history_collection.aggregate([
+        {"$project": {
+            "closed_at": 1,
+            "sold": {"$cond": [sold, 1, 0]},
+            "price": {"$cond": [sold, "$final_price", None]},
+            "granularity": list(GRANULARITIES)
+        }},
+        {"$unwind": "$granularity"},
+        {"$group": {
+            "_id": {
+                "granularity": "$granularity",
+                "bucket": {"$dateTrunc": {"date": "$closed_at", "unit": "$granularity"}}
+            },
+            "count": {"$sum": 1},
+            "sold": {"$sum": "$sold"},
+            "sum": {"$sum": "$price"},
+            "max": {"$max": "$price"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "granularity": "$_id.granularity",
+            "bucket": "$_id.bucket",
+            "count": 1,
+            "sold": 1,
+            "sum": 1,
+            "max": 1
+        }},
+        {"$out": report_timeseries_collection.name}
+    ]).to_list(length=None)
+    return await report_timeseries_collection.count_documents({})
+
+
+async def rebuild_summaries() -> dict:
+    """
+    Przeliczenie podsumowań od zera z auction.history.
+    Zamknięcia wykonane w trakcie przebudowy mogą się zgubić - uruchamiać w spokojnym okresie.
+    """
+    await history_collection.aggregate([
+        {"$match": {"winner_id": {"$ne": None}}},
+        {"$group": {
+            "_id": "$winner_id",
+            "total_spent": {"$sum": "$final_price"},
+            "won_count": {"$sum": 1}
+        }},
+        {"$out": report_winners_collection.name}
+    ]).to_list(length=None)
+
+    result = await history_collection.aggregate([
+        {"$group": {
+            "_id": None,
+            "closed_count": {"$sum": 1},
+            "cashflow": {"$sum": {"$cond": [{"$ne": [{"$ifNull": ["$winner_id", None]}, None]}, "$final_price", 0]}}
+        }}
+    ]).to_list(length=1)
+    totals = {
+        "closed_count": result[0]["closed_count"] if result else 0,
+        "cashflow": result[0]["cashflow"] if result else 0
+    }
+    await report_totals_collection.replace_one({"_id": TOTALS_ID}, totals, upsert=True)
+    return {**totals, "timeseries_buckets": await rebuild_timeseries()}
+
+
+async def migrate_closed_at_utc() -> int:
+    """
+    Jednorazowa migracja: wpisy historii sprzed closed_at_tz mają closed_at w czasie lokalnym
+    serwera (zapisanym bez strefy) - przeliczamy je na UTC według strefy tego hosta.
+    Idempotentna (warunek na brak closed_at_tz), bezpieczna przy kilku workerach naraz;
+    po zakończeniu znacznik (report.totals, _id "migrations") pomija skan historii przy kolejnych startach.
+    Zwraca liczbę przeliczonych wpisów.
+    """
+    if await report_totals_collection.find_one({"_id": MIGRATIONS_ID, "closed_at_utc": True}):
+        return 0
+    migrated = 0
+    async for doc in history_collection.find({"closed_at_tz": {"$exists": False}}, projection={"closed_at": 1}):
+        # astimezone na dacie bez strefy traktuje ją jako czas lokalny (z uwzględnieniem DST)
+        closed_at = doc["closed_at"].astimezone(timezone.utc)
+        result = await history_collection.update_one(
+            {"_id": doc["_id"], "closed_at_tz": {"$exists": False}},
+            {"$set": {"closed_at": closed_at, "closed_at_tz": "utc"}}
+        )
+        migrated += result.modified_count
+    await report_totals_collection.update_one({"_id": MIGRATIONS_ID}, {"$set": {"closed_at_utc": True}}, upsert=True)
+    if migrated:
+        logger.info("Przeliczono closed_at na UTC w %d wpisach historii", migrated)
+    return migrated
+
+
+async def ensure_summaries():
+    """
+    Przy pierwszym starcie (brak podsumowań) budujemy je z istniejącej historii.
+    Po migracji closed_at na UTC kubełki czasu są przebudowywane (wyliczane z closed_at).
+    """
+    migrated = await migrate_closed_at_utc()
+    totals = await report_totals_collection.find_one({"_id": TOTALS_ID})
+    if totals is None:
+        await rebuild_summaries()
+    elif migrated or (totals["closed_count"] and await report_timeseries_collection.find_one() is None):
+        await rebuild_timeseries()
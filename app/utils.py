@@ -1,11 +1,23 @@
+import asyncio
+import base64
+import hashlib
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta, timezone
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_MINUTES
-from database import logs_collection
+from config import PASSWORD_POOL_SIZE, PASSWORD_QUEUE_LIMIT
+from audit_log import audit_log
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt zwalnia GIL, więc pula wątków wystarcza, żeby nie blokować pętli zdarzeń
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_POOL_SIZE, thread_name_prefix="bcrypt")
+_password_jobs = 0  # zadania w puli (wykonywane + oczekujące)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Weryfikacja hasła (plaintext vs hashed)."""
@@ -17,6 +29,31 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_in_password_pool(func, *args):
+    global _password_jobs
+    if _password_jobs >= PASSWORD_POOL_SIZE + PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serwer jest przeciążony, spróbuj ponownie za chwilę",
+            headers={"Retry-After": "1"}
+        )
+    _password_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_pool, func, *args)
+    finally:
+        _password_jobs -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password w puli bcrypt (nie blokuje pętli zdarzeń). Przy przeciążeniu → 503."""
+    return await _run_in_password_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash w puli bcrypt (nie blokuje pętli zdarzeń). Przy przeciążeniu → 503."""
+    return await _run_in_password_pool(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     """Tworzy JWT (access token) z krótkim czasem wygaśnięcia."""
     to_encode = data.copy()
@@ -30,20 +67,29 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
 
 
 def create_refresh_token(data: dict, expires_delta: timedelta = None) -> str:
-    """Tworzy JWT (refresh token) z dłuższym czasem wygaśnięcia."""
+    """
+    Tworzy JWT (refresh token) z dłuższym czasem wygaśnięcia.
+    jti gwarantuje unikalność tokena (i jego skrótu w sessions) nawet w tej samej sekundzie.
+    """
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def hash_token(token: str) -> str:
+    """Skrót refresh tokena - w kolekcji sessions nie trzymamy samych tokenów."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 async def log_action(user_id: str, action: str, details: str = ""):
     """
-    Zapis operacji do kolekcji 'log'. 
+    Zapis operacji do kolekcji 'log' - wpis trafia do kolejki audit_log,
+    a do bazy zapisuje go paczkami worker w tle.
     Parametry:
     - user_id: str (tekstowo, ObjectId jako string)
     - action: nazwa akcji (np. 'login', 'create_auction')
@@ -55,4 +101,22 @@ async def log_action(user_id: str, action: str, details: str = ""):
         "details": details,
         "timestamp": datetime.now(timezone.utc)
     }
-    await logs_collection.insert_one(log_entry)
+    await audit_log.enqueue(log_entry)
+
+
+def encode_cursor(created_at: datetime, doc_id) -> str:
+    """Nieprzezroczysty token kontynuacji (keyset: created_at + _id)."""
+    raw = json.dumps({"c": created_at.isoformat(), "i": str(doc_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple:
+    """Odwrotność encode_cursor. Rzuca ValueError dla uszkodzonego tokena."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(data["i"], str):
+            raise TypeError("identyfikator kursora musi być tekstem")
+        return datetime.fromisoformat(data["c"]), data["i"]
+    except (KeyError, TypeError) as e:
+        raise ValueError(str(e))
@@ -0,0 +1,159 @@
+"""
+Porównanie ścieżek składania ofert:
+- "transaction": dotychczasowa (sesja + transakcja + find_one/update_one/insert_one, 5 ponowień co 0.1 s),
+- "atomic": bid_engine.apply_bid (jedna aktualizacja warunkowa + idempotentny zapis oferty),
+- "batch":  bid_engine.apply_bid_batch (POST /bids/batch) - paczki po --batch-size ofert na --auctions aukcji,
+            porównywane z tą samą liczbą ofert składanych pojedynczo przez apply_bid.
+
+Wymaga MongoDB w trybie replica set (transakcje) oraz zmiennych MONGO_URL / DB_NAME.
+Uruchomienie:  python testing/bench_bids.py [--bids 200] [--concurrency 2 10 100] [--batch-size 100] [--auctions 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from fastapi import HTTPException  # noqa: E402
+from pymongo.errors import OperationFailure  # noqa: E402
+
+from database import auctions_collection, bids_collection, get_client  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+from bid_engine import apply_bid, apply_bid_batch  # noqa: E402
+
+
+async def legacy_bid(auction_id, user_id, amount):
+    """Kopia poprzedniej implementacji place_bid (bez warstwy HTTP)."""
+    from bson import ObjectId
+    for attempt in range(5):
+        try:
+            async with await get_client().start_session() as session:
+                async with session.start_transaction():
+                    auc = await auctions_collection.find_one({"_id": ObjectId(auction_id)}, session=session)
+                    if amount <= auc["current_price"]:
+                        raise HTTPException(status_code=400, detail="too low")
+                    await auctions_collection.update_one(
+                        {"_id": ObjectId(auction_id)},
+                        {"$set": {"current_price": amount}},
+                        session=session
+                    )
+                    result = await bids_collection.insert_one({
+                        "auction_id": auction_id,
+                        "user_id": user_id,
+                        "amount": amount,
+                        "timestamp": datetime.utcnow()
+                    }, session=session)
+                    return await bids_collection.find_one({"_id": result.inserted_id}, session=session)
+        except OperationFailure as e:
+            if e.has_error_label("TransientTransactionError"):
+                if attempt == 4:
+                    raise HTTPException(status_code=500, detail="retries exhausted")
+                await asyncio.sleep(0.1)
+                continue
+            raise
+
+
+async def atomic_bid(auction_id, user_id, amount):
+    return await apply_bid(auction_id, user_id, amount)
+
+
+async def run(path, concurrency, total_bids):
+    auction = await auctions_collection.insert_one({
+        "title": "bench", "description": None, "owner_id": "bench",
+        "current_price": 1.0, "bid_seq": 0, "created_at": datetime.now()
+    })
+    auction_id = str(auction.inserted_id)
+    amounts = iter(range(2, total_bids + 2))
+    latencies = []
+    outcome = {"accepted": 0, "rejected": 0, "errors": 0}
+
+    async def bidder(n):
+        for amount in amounts:
+            start = time.perf_counter()
+            try:
+                await path(auction_id, f"bidder-{n}", float(amount))
+                outcome["accepted"] += 1
+            except HTTPException as e:
+                outcome["rejected" if e.status_code == 400 else "errors"] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bidder(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    await auctions_collection.delete_one({"_id": auction.inserted_id})
+    await bids_collection.delete_many({"auction_id": auction_id})
+
+    latencies.sort()
+    return {
+        "path": path.__name__,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        **outcome
+    }
+
+
+async def run_batch(batch_size, auction_count, total_bids):
+    """Ta sama liczba ofert: pojedynczo (apply_bid, sekwencyjnie) i paczkami (apply_bid_batch)."""
+    results = []
+    for mode in ("single", "batch"):
+        inserted = await auctions_collection.insert_many([{
+            "title": "bench", "description": None, "owner_id": "bench",
+            "current_price": 1.0, "bid_seq": 0, "bid_count": 0, "created_at": datetime.now()
+        } for _ in range(auction_count)])
+        auction_ids = [str(oid) for oid in inserted.inserted_ids]
+        bids = [
+            {"auction_id": auction_ids[n % auction_count], "amount": float(2 + n // auction_count)}
+            for n in range(total_bids)
+        ]
+
+        start = time.perf_counter()
+        accepted = 0
+        if mode == "single":
+            for bid in bids:
+                await apply_bid(bid["auction_id"], "bench-bot", bid["amount"])
+                accepted += 1
+        else:
+            for i in range(0, len(bids), batch_size):
+                batch = await apply_bid_batch("bench-bot", bids[i:i + batch_size])
+                accepted += sum(1 for r in batch if r["accepted"])
+        elapsed = time.perf_counter() - start
+
+        await auctions_collection.delete_many({"_id": {"$in": inserted.inserted_ids}})
+        await bids_collection.delete_many({"auction_id": {"$in": auction_ids}})
+        results.append({
+            "path": f"{mode}_bids",
+            "batch_size": batch_size if mode == "batch" else 1,
+            "auctions": auction_count,
+            "bids_per_s": round(len(bids) / elapsed, 1),
+            "accepted": accepted
+        })
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bids", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[2, 10, 100])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--auctions", type=int, default=10)
+    args = parser.parse_args()
+
+    await ensure_indexes()
+    results = []
+    for concurrency in args.concurrency:
+        for path in (legacy_bid, atomic_bid):
+            results.append(await run(path, concurrency, args.bids))
+            print(json.dumps(results[-1]))
+    for result in await run_batch(args.batch_size, args.auctions, args.bids * 10):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
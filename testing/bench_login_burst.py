@@ -0,0 +1,96 @@
+"""
+Wpływ fali logowań (bcrypt) na opóźnienie ofert.
+Mierzy opóźnienia POST /auctions/{id}/bid:
+- "baseline": same oferty,
+- "login_burst": oferty w trakcie --logins równoległych logowań.
+Jeśli bcrypt blokowałby pętlę zdarzeń, p99 ofert w drugiej fazie rośnie o rzędy wielkości.
+
+Wymaga działającego API (--api, domyślnie http://localhost:8000) uruchomionego z RATE_LIMIT_ENABLED=false -
+inaczej limit logowań per IP odrzuci większość fali (429) zanim dojdzie do bcrypt, a limit ofert
+spowolni fazę baseline; skrypt ostrzega, jeśli zobaczy 429.
+Uruchomienie:  python testing/bench_login_burst.py [--logins 200] [--bids 200]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+import httpx
+
+PASSWORD = "ktirhd24ivo22awn32#"
+
+
+async def register_and_login(client, api):
+    suffix = uuid.uuid4().hex[:10]
+    user = {"username": f"bench-{suffix}", "email": f"bench.{suffix}@example.com", "password": PASSWORD}
+    r = await client.post(f"{api}/register", json=user)
+    r.raise_for_status()
+    r = await client.post(f"{api}/login", data={"username": user["email"], "password": PASSWORD})
+    r.raise_for_status()
+    return user, r.json()["access_token"]
+
+
+async def bid_loop(client, api, token, auction_id, count, start_amount):
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    for n in range(count):
+        start = time.perf_counter()
+        await client.post(f"{api}/auctions/{auction_id}/bid", json={"amount": start_amount + n}, headers=headers)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def login_burst(client, api, user, count):
+    statuses = {}
+
+    async def one():
+        r = await client.post(f"{api}/login", data={"username": user["email"], "password": PASSWORD})
+        statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    await asyncio.gather(*(one() for _ in range(count)))
+    return statuses
+
+
+def summary(name, latencies, **extra):
+    latencies = sorted(latencies)
+    return {
+        "phase": name,
+        "bids": len(latencies),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        **extra
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--bids", type=int, default=200)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        user, token = await register_and_login(client, args.api)
+        r = await client.post(
+            f"{args.api}/auctions",
+            json={"title": "Login burst bench", "starting_price": 1.0},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        r.raise_for_status()
+        auction_id = r.json()["id"]
+
+        baseline = await bid_loop(client, args.api, token, auction_id, args.bids, 2)
+        print(json.dumps(summary("baseline", baseline)))
+
+        bids, statuses = await asyncio.gather(
+            bid_loop(client, args.api, token, auction_id, args.bids, 2 + args.bids),
+            login_burst(client, args.api, user, args.logins)
+        )
+        print(json.dumps(summary("login_burst", bids, login_statuses=statuses)))
+        if statuses.get(429):
+            print("Uwaga: logowania odrzucone limitem (429) - uruchom API z RATE_LIMIT_ENABLED=false", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+Koszt licytacji automatycznej (oferty maksymalne, bid_engine._apply_proxy).
+Dla N licytujących automatycznie (--proxies 2 10 100):
+- każdy ustawia ofertę maksymalną (rosnące limity - kolejne przebicia),
+- potem seria ofert ręcznych poniżej limitu prowadzącego (każda wywołuje automatyczną odpowiedź).
+Liczymy komendy zapisu (findAndModify/update/insert) z db_metrics.command_metrics na jedną
+przychodzącą ofertę - powinna być stała (aktualizacja aukcji + maks. 2 dokumenty ofert), niezależnie od N.
+
+Wymaga MongoDB (MONGO_URL / DB_NAME).
+Uruchomienie:  python testing/bench_proxy.py [--proxies 2 10 100] [--bids 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from database import auctions_collection, bids_collection  # noqa: E402
+from db_metrics import command_metrics  # noqa: E402
+from bid_engine import apply_bid, apply_proxy_bid  # noqa: E402
+
+WRITE_COMMANDS = ("findAndModify", "update", "insert")
+
+
+def write_count() -> int:
+    snapshot = command_metrics.snapshot()
+    return sum(snapshot.get(name, {}).get("count", 0) for name in WRITE_COMMANDS)
+
+
+async def run(proxies, bids):
+    auction = await auctions_collection.insert_one({
+        "title": "bench-proxy", "description": None, "owner_id": "bench",
+        "current_price": 1.0, "bid_seq": 0, "bid_count": 0, "highest_bidder_id": None, "created_at": datetime.now()
+    })
+    auction_id = str(auction.inserted_id)
+    top_max = 10.0 * proxies + 10 * bids
+
+    start = write_count()
+    for n in range(proxies):
+        # Ostatni (najwyższy) limit wystarcza na całą serię ofert ręcznych
+        await apply_proxy_bid(auction_id, f"proxy-{n}", top_max if n == proxies - 1 else 10.0 * (n + 1))
+    proxy_writes = write_count() - start
+
+    start = write_count()
+    price = (await auctions_collection.find_one({"_id": auction.inserted_id}))["current_price"]
+    for _ in range(bids):
+        price += 2
+        await apply_bid(auction_id, "manual-bidder", price)
+        price = (await auctions_collection.find_one({"_id": auction.inserted_id}))["current_price"]
+    bid_writes = write_count() - start
+
+    final = await auctions_collection.find_one({"_id": auction.inserted_id})
+    await auctions_collection.delete_one({"_id": auction.inserted_id})
+    await bids_collection.delete_many({"auction_id": auction_id})
+    return {
+        "proxies": proxies,
+        "writes_per_proxy_bid": round(proxy_writes / proxies, 2),
+        "writes_per_manual_bid": round(bid_writes / bids, 2),
+        "leader": final["highest_bidder_id"],
+        "final_price": final["current_price"]
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--proxies", type=int, nargs="+", default=[2, 10, 100])
+    parser.add_argument("--bids", type=int, default=200)
+    args = parser.parse_args()
+    for proxies in args.proxies:
+        print(json.dumps(await run(proxies, args.bids)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
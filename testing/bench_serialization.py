@@ -0,0 +1,101 @@
+"""
+Mikrobenchmark serializacji list (bez bazy i bez HTTP):
+- "pydantic": dotychczasowa ścieżka - model *Out per dokument, potem walidacja response_model
+  i serializacja przez FastAPI (dump_python(mode="json") + json.dumps),
+- "orjson":   serialization.doc_out + orjson (ORJSONResponse).
+Wynik: dokumenty na sekundę dla list AuctionOut i BidOut.
+
+Uruchomienie:  python testing/bench_serialization.py [--docs 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from bson import ObjectId  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from schemas import AuctionOut, BidOut  # noqa: E402
+from serialization import ORJSONResponse, doc_out, AUCTION_FIELDS, BID_FIELDS  # noqa: E402
+
+
+def auction_docs(n):
+    now = datetime.now()
+    return [{
+        "_id": ObjectId(),
+        "title": f"Aukcja {i}",
+        "description": "Opis przedmiotu " * 4,
+        "owner_id": str(ObjectId()),
+        "current_price": 100.0 + i,
+        "created_at": now - timedelta(seconds=i),
+        "ends_at": now + timedelta(hours=1)
+    } for i in range(n)]
+
+
+def bid_docs(n):
+    now = datetime.utcnow()
+    auction_id = str(ObjectId())
+    return [{
+        "_id": ObjectId(),
+        "auction_id": auction_id,
+        "user_id": str(ObjectId()),
+        "amount": 100.0 + i,
+        "seq": i + 1,
+        "timestamp": now
+    } for i in range(n)]
+
+
+def pydantic_path(model, fields):
+    adapter = TypeAdapter(List[model])
+
+    def run(docs):
+        items = [model(id=str(d["_id"]), **{f: d.get(f) for f in fields}) for d in docs]
+        validated = adapter.validate_python(items)
+        return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+    return run
+
+
+def orjson_path(fields):
+    def run(docs):
+        return ORJSONResponse([doc_out(d, fields) for d in docs]).body
+    return run
+
+
+def measure(run, docs, repeat):
+    run(docs)  # rozgrzewka
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(docs)
+        best = min(best, time.perf_counter() - start)
+    return len(docs) / best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for name, model, fields, docs in [
+        ("AuctionOut", AuctionOut, AUCTION_FIELDS, auction_docs(args.docs)),
+        ("BidOut", BidOut, BID_FIELDS, bid_docs(args.docs)),
+    ]:
+        before = measure(pydantic_path(model, fields), docs, args.repeat)
+        after = measure(orjson_path(fields), docs, args.repeat)
+        results[name] = {
+            "pydantic_docs_per_s": round(before),
+            "orjson_docs_per_s": round(after),
+            "speedup": round(after / before, 2)
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
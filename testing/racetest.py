@@ -1,101 +1,349 @@
+"""
+Harness obciążeniowy API aukcji.
+
+Scenariusze (--scenario, można podać kilka):
+- race:        pary identycznych ofert wysyłanych jednocześnie (dawny racetest) - dokładnie jedna z pary musi przejść,
+- bid-storm:   strumień ofert na jedną "gorącą" aukcję,
+- browse:      przeglądanie katalogu (GET /auctions ze stronicowaniem, GET /auctions/{id}),
+- login-burst: fala logowań,
+- reports:     zapytania raportowe (wymaga --admin-email/--admin-password).
+
+Ruch jest otwarty (open-loop): żądania startują w stałym tempie --rate/s niezależnie od odpowiedzi,
+a opóźnienie liczone jest od zaplanowanego startu (bez "coordinated omission").
+Wszystkie żądania idą przez jeden klient HTTP (reużycie połączeń).
+
+Wynik (JSON, --out): p50/p95/p99, przepustowość, statusy i wynik sprawdzenia niezmienników
+(cena końcowa = najwyższa przyjęta oferta, brak zgubionych ofert).
+
+Cel:
+- --api http://host:8000 - działające API (np. z lokalnym mongod w trybie replica set),
+- --in-process           - aplikacja z app/main.py uruchomiona w tym procesie (ASGI, bez sieci),
+                           korzystająca z bazy z MONGO_URL / DB_NAME.
+Pomiar przepustowości: API uruchomione z RATE_LIMIT_ENABLED=false (inaczej część żądań dostanie 429,
+co widać w statusach wyniku).
+
+Przykład:  python testing/racetest.py --scenario bid-storm browse --rate 200 --duration 20 --out bench.json
+"""
+import argparse
 import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import time
+import uuid
 import httpx
 
 API_URL = "http://localhost:8000"
-USERS = [
-    {"username": "test-user-xkawofngyh131", "email": "testuser.xkawo@example.com", "password": "ktirhd24ivo22awn32#"},
-    {"username": "test-user-jjkoelfmah125", "email": "testuser.jjkoe@example.com", "password": "ktirhd24ivo22awn32#"},
-    {"username": "test-user-kdrihnekog232", "email": "testuser.kdrih@example.com", "password": "ktirhd24ivo22awn32#"},
-]
+PASSWORD = "ktirhd24ivo22awn32#"
 
 
-async def register_or_login(client: httpx.AsyncClient, user):
-    try:
-        r = await client.post(f"{API_URL}/register", json=user)
-        r.raise_for_status()
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 400:
-            print(f"[!] {user['username']} already exists, trying to login...")
-        else:
-            raise
-
-    r = await client.post(
-        f"{API_URL}/login",
-        data={
-            "username": user["email"],
-            "password": user["password"]
-        },
-        headers={
-            "Content-Type": "application/x-www-form-urlencoded"
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def token_subject(token):
+    """Identyfikator użytkownika z JWT (bez weryfikacji podpisu - tylko do testów)."""
+    payload = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["sub"]
+
+
+class Recorder:
+    """Zbiera opóźnienia i statusy jednego scenariusza."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.started = None
+        self.finished = None
+
+    def record(self, latency, status):
+        self.latencies.append(latency)
+        key = str(status)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        elapsed = (self.finished or time.perf_counter()) - (self.started or 0)
+        ms = lambda v: round(v * 1000, 2) if v is not None else None
+        return {
+            "scenario": self.name,
+            "requests": len(latencies),
+            "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+            "p50_ms": ms(percentile(latencies, 0.50)),
+            "p95_ms": ms(percentile(latencies, 0.95)),
+            "p99_ms": ms(percentile(latencies, 0.99)),
+            "max_ms": ms(latencies[-1] if latencies else None),
+            "statuses": self.statuses,
+            "transport_errors": self.errors
         }
-    )
 
 
-    r.raise_for_status()
-    token = r.json()["access_token"]
-    return token
+async def open_loop(recorder, rate, duration, max_in_flight, make_request):
+    """
+    Generator ruchu otwartego: co 1/rate s startuje make_request(i) -> (status, kontekst).
+    Opóźnienie liczone od zaplanowanego momentu startu.
+    """
+    interval = 1.0 / rate
+    in_flight = set()
+    recorder.started = time.perf_counter()
+    end = recorder.started + duration
+    i = 0
 
+    async def one(n, scheduled):
+        try:
+            status = await make_request(n)
+        except httpx.HTTPError:
+            recorder.errors += 1
+            return
+        recorder.record(time.perf_counter() - scheduled, status)
+
+    while True:
+        scheduled = recorder.started + i * interval
+        if scheduled >= end:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            # Nie dokładamy w nieskończoność - liczymy jako przeciążenie
+            recorder.record(0.0, "client_overload")
+        else:
+            task = asyncio.create_task(one(i, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        i += 1
 
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    recorder.finished = time.perf_counter()
 
-async def create_auction(token):
-    headers = {"Authorization": f"Bearer {token}"}
-    data = {
-        "title": "Race Condition Test Auction",
-        "description": "Let's test race conditions.",
-        "starting_price": 100.0,
-        "duration_minutes": 10
-    }
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{API_URL}/auctions", json=data, headers=headers)
+
+class Harness:
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.users = []  # (user, token, user_id)
+
+    async def register_or_login(self, user):
+        r = await self.client.post("/register", json=user)
+        if r.status_code not in (200, 400):
+            r.raise_for_status()
+        r = await self.client.post("/login", data={"username": user["email"], "password": user["password"]})
+        r.raise_for_status()
+        token = r.json()["access_token"]
+        return token, token_subject(token)
+
+    async def ensure_users(self, count):
+        while len(self.users) < count:
+            suffix = uuid.uuid4().hex[:10]
+            user = {"username": f"bench-{suffix}", "email": f"bench.{suffix}@example.com", "password": PASSWORD}
+            token, user_id = await self.register_or_login(user)
+            self.users.append((user, token, user_id))
+        return self.users[:count]
+
+    def auth(self, token):
+        return {"Authorization": f"Bearer {token}"}
+
+    async def create_auction(self, token, title="Benchmark auction", starting_price=100.0):
+        r = await self.client.post(
+            "/auctions",
+            json={"title": title, "description": "Load test", "starting_price": starting_price},
+            headers=self.auth(token)
+        )
         r.raise_for_status()
         return r.json()["id"]
 
+    async def auction_bids(self, auction_id, bidders):
+        """Oferty zapisane w bazie dla aukcji (z historii ofert licytujących)."""
+        stored = []
+        for _, token, user_id in bidders:
+            r = await self.client.get(f"/users/{user_id}/bids", headers=self.auth(token))
+            r.raise_for_status()
+            stored.extend(b for b in r.json() if b["auction_id"] == auction_id)
+        return stored
 
-async def place_bid(token, auction_id, amount):
-    headers = {"Authorization": f"Bearer {token}"}
-    data = {"amount": amount}
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{API_URL}/auctions/{auction_id}/bid", json=data, headers=headers)
-        print(f"[BID] Status: {r.status_code}, Amount: {amount}, Response: {r.text}")
+    # --- scenariusze ---
 
+    async def race(self):
+        creator, bidder1, bidder2 = await self.ensure_users(3)
+        auction_id = await self.create_auction(creator[1], "Race Condition Test Auction")
+        recorder = Recorder("race")
+        recorder.started = time.perf_counter()
+        violations = []
+        accepted = []
+
+        async def bid(token, amount):
+            start = time.perf_counter()
+            r = await self.client.post(f"/auctions/{auction_id}/bid", json={"amount": amount}, headers=self.auth(token))
+            recorder.record(time.perf_counter() - start, r.status_code)
+            return r.status_code
+
+        for amount in [150.0, 200.0, 250.0]:
+            statuses = await asyncio.gather(bid(bidder1[1], amount), bid(bidder2[1], amount))
+            if statuses.count(200) != 1:
+                violations.append(f"amount {amount}: statusy {statuses}, oczekiwano dokładnie jednego 200")
+            else:
+                accepted.append(amount)
+        recorder.finished = time.perf_counter()
+
+        violations += await self.check_auction(auction_id, accepted, [bidder1, bidder2])
+        return recorder.summary() | {"invariants": {"ok": not violations, "violations": violations}}
+
+    async def bid_storm(self):
+        bidders = await self.ensure_users(self.args.bidders + 1)
+        creator, bidders = bidders[0], bidders[1:]
+        auction_id = await self.create_auction(creator[1], "Bid storm auction")
+        recorder = Recorder("bid-storm")
+        accepted = []
+
+        async def make_request(i):
+            _, token, _ = random.choice(bidders)
+            # Kwoty rosną, ale z rozrzutem - część ofert przegrywa wyścig i powinna dostać 400
+            amount = round(100.0 + i + random.uniform(0, 5), 2)
+            r = await self.client.post(f"/auctions/{auction_id}/bid", json={"amount": amount}, headers=self.auth(token))
+            if r.status_code == 200:
+                accepted.append(amount)
+            return r.status_code
+
+        await open_loop(recorder, self.args.rate, self.args.duration, self.args.max_in_flight, make_request)
+        violations = await self.check_auction(auction_id, accepted, bidders)
+        return recorder.summary() | {"invariants": {"ok": not violations, "violations": violations}}
+
+    async def browse(self):
+        (_, token, _), = await self.ensure_users(1)
+        for n in range(self.args.catalog_size):
+            await self.create_auction(token, f"Catalog item {n}", 10.0 + n)
+        recorder = Recorder("browse")
+        known_ids = []
+
+        async def make_request(i):
+            if i % 2 == 0 or not known_ids:
+                r = await self.client.get("/auctions", params={"limit": 50})
+                if r.status_code == 200:
+                    known_ids[:] = [a["id"] for a in r.json()][:100]
+                    cursor = r.headers.get("X-Next-Cursor")
+                    if cursor:
+                        await self.client.get("/auctions", params={"limit": 50, "cursor": cursor})
+            else:
+                r = await self.client.get(f"/auctions/{random.choice(known_ids)}")
+            return r.status_code
+
+        await open_loop(recorder, self.args.rate, self.args.duration, self.args.max_in_flight, make_request)
+        return recorder.summary()
+
+    async def login_burst(self):
+        (user, _, _), = await self.ensure_users(1)
+        recorder = Recorder("login-burst")
+
+        async def make_request(i):
+            r = await self.client.post("/login", data={"username": user["email"], "password": user["password"]})
+            return r.status_code
+
+        await open_loop(recorder, self.args.rate, self.args.duration, self.args.max_in_flight, make_request)
+        return recorder.summary()
+
+    async def reports(self):
+        if not self.args.admin_email:
+            return {"scenario": "reports", "skipped": "brak --admin-email/--admin-password"}
+        admin = {"email": self.args.admin_email, "password": self.args.admin_password}
+        r = await self.client.post("/login", data={"username": admin["email"], "password": admin["password"]})
+        r.raise_for_status()
+        headers = self.auth(r.json()["access_token"])
+        endpoints = ["/reports/user-spending", "/reports/top-winners", "/reports/total-cashflow",
+                     "/reports/auctions-stats", "/reports/high-value-auctions", "/reports/last-week-auctions"]
+        recorder = Recorder("reports")
+
+        async def make_request(i):
+            r = await self.client.get(endpoints[i % len(endpoints)], headers=headers)
+            return r.status_code
+
+        await open_loop(recorder, self.args.rate, self.args.duration, self.args.max_in_flight, make_request)
+        return recorder.summary()
+
+    async def check_auction(self, auction_id, accepted, bidders):
+        """Niezmienniki: cena = najwyższa przyjęta oferta, każda przyjęta oferta jest zapisana."""
+        violations = []
+        r = await self.client.get(f"/auctions/{auction_id}")
+        r.raise_for_status()
+        price = r.json()["current_price"]
+        if accepted and price != max(accepted):
+            violations.append(f"cena {price} != najwyższa przyjęta oferta {max(accepted)}")
+        stored = await self.auction_bids(auction_id, bidders)
+        if len(stored) != len(accepted):
+            violations.append(f"zapisanych ofert {len(stored)} != przyjętych {len(accepted)}")
+        missing = sorted(set(accepted) - {b["amount"] for b in stored})
+        if missing:
+            violations.append(f"zgubione oferty: {missing[:10]}")
+        return violations
+
+
+SCENARIOS = {
+    "race": Harness.race,
+    "bid-storm": Harness.bid_storm,
+    "browse": Harness.browse,
+    "login-burst": Harness.login_burst,
+    "reports": Harness.reports,
+}
+
+
+def make_client(args):
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    if args.in_process:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+        from main import app
+        return app, httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+    return None, httpx.AsyncClient(base_url=args.api, limits=limits, timeout=60)
 
-async def close_auction(token, auction_id):
-    headers = {"Authorization": f"Bearer {token}"}
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{API_URL}/auctions/{auction_id}/close", headers=headers)
-        if r.status_code == 200:
-            print(f"✅ Auction {auction_id} closed.")
-        else:
-            print(f"⚠️ Failed to close auction {auction_id}: {r.status_code} - {r.text}")
 
 async def main():
-    async with httpx.AsyncClient() as client:
-        tokens = []
-        for user in USERS:
-            try:
-                token = await register_or_login(client, user)
-                tokens.append(token)
-            except Exception as e:
-                print(f"❌ Failed for {user['username']}: {e}")
-                return
-
-    creator_token = tokens[0]
-    bidder1_token = tokens[1]
-    bidder2_token = tokens[2]
-
-    auction_id = await create_auction(creator_token)
-    print(f"✅ Auction created: {auction_id}")
-
-    bid_amounts = [150, 200, 250]
-
-    for amount in bid_amounts:
-        await asyncio.gather(
-            place_bid(bidder1_token, auction_id, amount),
-            place_bid(bidder2_token, auction_id, amount)
-        )
-        await asyncio.sleep(1)
+    parser = argparse.ArgumentParser(description="Harness obciążeniowy API aukcji")
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS) + ["all"], default=["race"])
+    parser.add_argument("--api", default=API_URL)
+    parser.add_argument("--in-process", action="store_true", help="uruchom aplikację w tym procesie (ASGI)")
+    parser.add_argument("--rate", type=float, default=50.0, help="żądania na sekundę (ruch otwarty)")
+    parser.add_argument("--duration", type=float, default=10.0, help="czas trwania scenariusza [s]")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--bidders", type=int, default=10)
+    parser.add_argument("--catalog-size", type=int, default=200)
+    parser.add_argument("--admin-email")
+    parser.add_argument("--admin-password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="plik JSON z wynikami (do porównań regresji)")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    scenarios = list(SCENARIOS) if "all" in args.scenario else args.scenario
+    app, client = make_client(args)
+    if app is not None:
+        await app.router.startup()
+    results = []
+    try:
+        async with client:
+            harness = Harness(client, args)
+            for name in scenarios:
+                result = await SCENARIOS[name](harness)
+                print(json.dumps(result, ensure_ascii=False))
+                results.append(result)
+    finally:
+        if app is not None:
+            await app.router.shutdown()
+
+    report = {"config": {k: v for k, v in vars(args).items() if "password" not in k}, "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
 
-    await close_auction(creator_token, auction_id)
+    failed = [r["scenario"] for r in results if not r.get("invariants", {"ok": True})["ok"]]
+    if failed:
+        print(f"Naruszone niezmienniki: {', '.join(failed)}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+"""
+Rozstrzyganie ofert maksymalnych (bid_engine._resolve) - funkcja czysta, bez MongoDB;
+pętla CAS (_apply_proxy) na podstawionej kolekcji.
+Uruchomienie:  python -m pytest testing/test_proxy_resolve.py
+"""
+import asyncio
+import os
+import random
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import bid_engine  # noqa: E402
+from bid_engine import _resolve  # noqa: E402
+from config import PROXY_CAS_RETRIES  # noqa: E402
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+def test_leader_manual_bid_below_own_max_keeps_max():
+    auc = {
+        "current_price": 101,
+        "highest_bidder_id": "A",
+        "proxy_top": [
+            {"user_id": "A", "max_amount": 200, "at": T0},
+            {"user_id": "B", "max_amount": 100, "at": T0 + timedelta(seconds=1)}
+        ]
+    }
+    proxy_top, price, leader, records = _resolve(auc, "A", 150, True, T0 + timedelta(minutes=1))
+    assert price == 150
+    assert leader == "A"
+    assert records == [("A", 150)]
+    assert proxy_top[0] == {"user_id": "A", "max_amount": 200, "at": T0}
+
+
+def test_leader_manual_bid_above_own_max_replaces_it():
+    auc = {
+        "current_price": 101,
+        "highest_bidder_id": "A",
+        "proxy_top": [{"user_id": "A", "max_amount": 200, "at": T0}]
+    }
+    now = T0 + timedelta(minutes=1)
+    proxy_top, price, leader, records = _resolve(auc, "A", 250, True, now)
+    assert (price, leader, records) == (250, "A", [("A", 250)])
+    assert proxy_top == []  # maksimum równe cenie - powrót na szybką ścieżkę
+
+
+def test_manual_bid_tying_leader_max_is_rejected_before_any_write():
+    auc = {
+        "current_price": 101,
+        "highest_bidder_id": "A",
+        "proxy_top": [{"user_id": "A", "max_amount": 200, "at": T0}]
+    }
+    # Remis: wcześniejsze maksimum wygrywa - oferta B nie zostałaby zapisana, więc 400 zanim powstanie zapis
+    with pytest.raises(HTTPException) as e:
+        _resolve(auc, "B", 200, True, T0 + timedelta(minutes=1))
+    assert e.value.status_code == 400
+
+
+def test_at_most_two_records_per_call():
+    rng = random.Random(7)
+    auc = {"current_price": 1.0, "highest_bidder_id": None, "proxy_top": []}
+    now = T0
+    for _ in range(2000):
+        now += timedelta(seconds=1)
+        user_id = f"u{rng.randrange(20)}"
+        manual = rng.random() < 0.3
+        value = auc["current_price"] + rng.choice([1, 2, 5, 10, 50])
+        own = next((entry for entry in auc["proxy_top"] if entry["user_id"] == user_id), None)
+        if not manual and own is not None and value < own["max_amount"]:
+            continue  # _apply_proxy nie pozwala obniżyć maksimum
+        try:
+            proxy_top, price, leader, records = _resolve(auc, user_id, value, manual, now)
+        except HTTPException:
+            continue
+        assert len(records) <= 2
+        assert price >= auc["current_price"]
+        if records:
+            assert records[-1] == (leader, price)
+        auc = {"current_price": price, "highest_bidder_id": leader, "proxy_top": proxy_top}
+
+
+class _ConflictingAuctions:
+    """Kolekcja, w której aktualizacja warunkowa zawsze przegrywa z równoległą ofertą."""
+
+    def __init__(self, doc: dict):
+        self.doc = doc
+        self.updates = 0
+
+    async def find_one(self, query, *args, **kwargs):
+        return dict(self.doc)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        self.updates += 1
+        return None
+
+
+def test_cas_exhaustion_returns_409(monkeypatch):
+    auction_id = ObjectId()
+    auctions = _ConflictingAuctions({
+        "_id": auction_id, "current_price": 101, "highest_bidder_id": "A", "bid_seq": 3, "proxy_rev": 1,
+        "proxy_top": [{"user_id": "A", "max_amount": 200, "at": T0}]
+    })
+
+    @asynccontextmanager
+    async def no_session():
+        yield None
+
+    monkeypatch.setattr(bid_engine, "auctions_collection", auctions)
+    monkeypatch.setattr(bid_engine, "write_session", no_session)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(bid_engine.apply_proxy_bid(str(auction_id), "B", 300))
+    assert e.value.status_code == 409
+    assert auctions.updates == PROXY_CAS_RETRIES